@@ -1,16 +1,19 @@
+import time
+
 import streamlit as st
-import pandas as pd
 from rtttl import (
-    freq_to_note_name,
-    generate_tone,
-    parse_rtttl,
-    generate_arduino_code,
-    parse_rtttl2,
+    EDIT_STATE_MAX_BYTES,
+    METRICS,
+    cached_arduino_code,
+    cached_melody,
+    cached_mix_wav_bytes,
+    cached_plot_spec,
+    cached_wav_bytes,
+    edit_melody,
 )
-import numpy as np
-from scipy.io.wavfile import write
-import tempfile
-import plotly.graph_objects as go
+from song_store import open_store
+
+inicio_execucao = time.perf_counter()
 
 # Configuração inicial da página
 st.set_page_config(page_title="RTTTL to Arduino", page_icon="🎶", layout="wide")
@@ -69,77 +72,94 @@ Então vamos lá!!! 🎵🎵🎵
 """
 )
 st.write("---")
+
+
+# O acervo é aberto uma vez por processo e compartilhado entre as sessões
+@st.cache_resource
+def load_song_store():
+    return open_store("rtttl_songs.txt")
+
+
 with st.container():
     st.markdown(
         "<h2 style='color: #4CAF50;'>🎶 Veja uma lista com várias melodias</h2>",
         unsafe_allow_html=True,
     )
-    st.dataframe(pd.read_csv("rtttl_songs.psv", sep="|"), use_container_width=True)
+    with METRICS.span("app.catalog"):
+        store = load_song_store()
+        pagina = st.number_input(
+            f"Página (de {store.page_count()})",
+            min_value=1,
+            max_value=store.page_count(),
+            value=1,
+        )
+        st.dataframe(store.page(pagina - 1), use_container_width=True)
     st.write("---")
 
 
-melodias_predefinidas = {
-    "Flinstones": "Flinstones:d=4,o=5,b=40:32p,16f6,16a#,16a#6,32g6,16f6,16a#.,16f6,32d#6,32d6,32d6,32d#6,32f6,16a#,16c6,d6,16f6,16a#.,16a#6,32g6,16f6,16a#.,32f6,32f6,32d#6,32d6,32d6,32d#6,32f6,16a#,16c6,a#,16a6,16d.6,16a#6,32a6,32a6,32g6,32f#6,32a6,8g6,16g6,16c.6,32a6,32a6,32g6,32g6,32f6,32e6,32g6,8f6,16f6,16a#.,16a#6,32g6,16f6,16a#.,16f6,32d#6,32d6,32d6,32d#6,32f6,16a#,16c.6,32d6,32d#6,32f6,16a#,16c.6,32d6,32d#6,32f6,16a#6,16c7,8a#.6",
-    "Mission Impossible": "Mission Impossible:d=16,o=6,b=95:32d,32d#,32d,32d#,32d,32d#,32d,32d#,32d,32d,32d#,32e,32f,32f#,32g,g,8p,g,8p,a#,p,c7,p,g,8p,g,8p,f,p,f#,p,g,8p,g,8p,a#,p,c7,p,g,8p,g,8p,f,p,f#,p,a#,g,2d,32p,a#,g,2c#,32p,a#,g,2c,a#5,8c,2p,32p,a#5,g5,2f#,32p,a#5,g5,2f,32p,a#5,g5,2e,d#,8d",
-    "Super Mario": "Super Mario:d=4,o=5,b=100:16e6,16e6,32p,8e6,16c6,8e6,8g6,8p,8g,8p,8c6,16p,8g,16p,8e,16p,8a,8b,16a#,8a,16g.,16e6,16g6,8a6,16f6,8g6,8e6,16c6,16d6,8b,16p,8c6,16p,8g,16p,8e,16p,8a,8b,16a#,8a,16g.,16e6,16g6,8a6,16f6,8g6,8e6,16c6,16d6,8b,8p,16g6,16f#6,16f6,16d#6,16p,16e6,16p,16g#,16a,16c6,16p,16a,16c6,16d6,8p,16g6,16f#6,16f6,16d#6,16p,16e6,16p,16c7,16p,16c7,16c7,p,16g6,16f#6,16f6,16d#6,16p,16e6,16p,16g#,16a,16c6,16p,16a,16c6,16d6,8p,16d#6,8p,16d6,8p,16c6",
-    "The Simpsons": "The Simpsons:d=4,o=5,b=160:c.6,e6,f#6,8a6,g.6,e6,c6,8a,8f#,8f#,8f#,2g,8p,8p,8f#,8f#,8f#,8g,a#.,8c6,8c6,8c6,c6",
-    "Indiana Jones": "Indiana Jones:d=4,o=5,b=250:e,8p,8f,8g,8p,1c6,8p.,d,8p,8e,1f,p.,g,8p,8a,8b,8p,1f6,p,a,8p,8b,2c6,2d6,2e6,e,8p,8f,8g,8p,1c6,p,d6,8p,8e6,1f.6,g,8p,8g,e.6,8p,d6,8p,8g,e.6,8p,d6,8p,8g,f.6,8p,e6,8p,8d6,2c6",
-    "James Bond": "James Bond:d=4,o=5,b=320:c,8d,8d,d,2d,c,c,c,c,8d#,8d#,2d#,d,d,d,c,8d,8d,d,2d,c,c,c,c,8d#,8d#,d#,2d#,d,c#,c,c6,1b.,g,f,1g.",
-    "Star Wars": "Star Wars:d=4,o=5,b=45:32p,32f#,32f#,32f#,8b.,8f#.6,32e6,32d#6,32c#6,8b.6,16f#.6,32e6,32d#6,32c#6,8b.6,16f#.6,32e6,32d#6,32e6,8c#.6,32f#,32f#,32f#,8b.,8f#.6,32e6,32d#6,32c#6,8b.6,16f#.6,32e6,32d#6,32c#6,8b.6,16f#.6,32e6,32d#6,32e6,8c#6",
-    "Mozzart": "we-rock:d=4,o=6,b=140:32d#.5,32d.5,32d#.5,8f#.5,32g#.5,32f#.5,32f.5,32f#.5,8a#.5,16b5,16a#5,16a5,16a#5,16f6,16d#6,16d6,16d#6,16f6,16d#6,16d6,16d#6,8f#.6,8d#6,8f#6,32c#6,32d#6,16f6,8d#6,8c#6,8d#6,32c#6,32d#6,16f6,8d#6,8c#6,8d#6,32c#6,32d#6,16f6,8d#6,8c#6,8c6,4a#5,16f5,32d#5,16d5,16d#5,4f#5,16g#5,16f#5,16f5,16f#5,4a#5,16b5,16a#5,16a5,16a#5,16f6,16d#6,16d6,16d#6,16f6,16d#6,16d6,16d#6,4f#6,8d#6,8f#6,32c#6,32d#6,16f6,8d#6,8c#6,8d#6,32c#6,32d#6,16f6,8d#6,8c#6,8d#6,32c#6,32d#6,16f6,8d#6,8c#6,8c6,4a#5,8a#5,8b5,8c#6,8c#6,16d#6,16c#6,16b5,",
-    "Matrix": "Matrix:d=4,o=6,b=50:32c#5,32d#5,16g#5,16c#5,16c#5,16g#5,16g#5,16g5,32d#5,32f5,16g5,16d#5,16f5,16g5,16c#5,16g#5,16c#5,16c#5,16g#5,16g#5,16g5,16f5,d#5,32c#5,32d#5,16g#5,16c#5,16c#5,16g#5,16g#5,16g5,32d#5,32f5,16g5,16f5,16g5,16g#5,16c,16a#5,16g#5,16a#5,16g#5,16g5",
-    "The X Files": "The X Files:d=4,o=5,b=112:16c,16d#,16g,8g#,2p,8p,c,c,c,c,g,f,g,a#,16g,16d#,16g,8g#,2p,p,2d.6,d#6,d6,c6,a#,d6,2g.,d#6,d6,c6,a#,d6,1g,16c,16d#,16g,8g#,2p,p,c,c,c",
-    "Beatles - All you need is love": "Beatles - All you need is love:d=4,o=5,b=140:8g6,16p,8g6,8g6,16p,8g6,16p,16p,8g6,2p,16b6,16p,16p,8a#6,8a6,16g#6,8g6,p,8g6,16p,8g6,8g6,16p,8g6,8p,8g6,p,8p,8b6,16p,8a#6,16a6,8g#6,8g6,p,8g6,16p,8g6,8g#6,16p,8g#6,8p,a6,p,2e6,p,8d6,16e6,8d6,8p,16c6,8c6,",
-    "X-Men-Them": "X-Men-Them:d=4,o=6,b=70:32g,32c,32d,32d_,8d,16c,g,32g,32c.,32d,32d_,8d,16c,g_,32g,32c,32d,32d_.,8d,16c,2d_,16d,2c,32c,32f,32g,32g_.,8g,16f,8c.,32c,32f,32g,32g_,8g,16f,8c_,32g,32c.,32d,32d_.,8d,16c,2d_,16d,16c",
-    "X-MenCarto": "X-MenCarto:d=4,o=6,b=125:8c,8c,8d_,8c,8d_,8d_,8f,8d_,8c,8c,8d_,8c,8d_,8d_,8f,8d_,8c,8c,8d_,8c,8d_,8d_,8f,8d_,8c,8c,8d_,8c,d_,8g5,16c,16d_,d,8c,2g5,16c,16d_,d,8c,2g_5,16c,16d_,d,8c,d_,8p,g5,c,8p",
-}
+# As melodias pré-definidas vêm pré-interpretadas, no mesmo formato do acervo
+@st.cache_resource
+def load_presets():
+    return open_store("presets.txt")
+
+
+def preset_melody(rtttl_string):
+    # Melodia já interpretada quando o texto é exatamente o de um preset
+    for song_id in presets.find(rtttl_string.split(":")[0]):
+        if presets.rtttl(song_id) == rtttl_string:
+            return presets.melody(song_id)
+    return None
 
+
+presets = load_presets()
 melodia_selecionada = st.selectbox(
     "Escolha uma melodia (ou copie da lista acima ou crie a sua própria melodia):",
-    ["Selecione..."] + list(melodias_predefinidas.keys()),
+    ["Selecione..."] + presets.names,
 )
 
 
-def play_melody(melody, sample_rate=44100):
-    audio = np.concatenate(
-        [generate_tone(freq, duration, sample_rate) for freq, duration in melody]
-    )
-    audio = (audio * 32767).astype(np.int16)  # Convert to 16-bit PCM format
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".wav")
-    write(temp_file.name, sample_rate, audio)
-    st.audio(temp_file.name, format="audio/wav")
-
-
-# Função para exibir visualização gráfica das notas
-def plot_notes(melody):
-    frequencies, durations = zip(*melody)
-    times = np.cumsum(durations)
-    note_names = [freq_to_note_name(freq) for freq in frequencies]
-
-    fig = go.Figure()
-    fig.add_trace(
-        go.Scatter(
-            x=times,  # Eixo X é o tempo acumulado
-            y=frequencies,  # Eixo Y é a frequência
-            mode="lines+markers+text",
-            text=note_names,  # Nome das notas exibido como rótulo
-            textposition="top center",
-            line=dict(color="royalblue", width=2),
-            marker=dict(size=8),
+def play_melody(rtttl_string, sample_rate=44100, waveform="sine", outras_vozes=()):
+    if waveform != "sine" or outras_vozes:
+        # outra forma de onda ou mais vozes: mistura com envelopes
+        vozes = [rtttl_string, *outras_vozes]
+        audio = cached_mix_wav_bytes(vozes, waveform, sample_rate)
+        with METRICS.span("app.audio"):
+            st.audio(audio, format="audio/wav")
+        return
+
+    # Durante a edição só as notas alteradas são sintetizadas de novo; o WAV
+    # é montado em memória, sem arquivos temporários. Se ele já está no cache
+    # nada é sintetizado e o estado de edição da sessão é descartado; músicas
+    # longas também não o mantêm, para a memória por sessão ficar limitada
+    def editar():
+        edicao = edit_melody(
+            st.session_state.pop("edicao", None), rtttl_string, sample_rate
         )
-    )
-    fig.update_layout(
-        title="Visualização da Melodia com Notas Musicais",
-        xaxis_title="Tempo (ms)",
-        yaxis_title="Frequência (Hz)",
-        template="plotly_white",
-    )
-    st.plotly_chart(fig)
+        if edicao.audio.nbytes <= EDIT_STATE_MAX_BYTES:
+            st.session_state["edicao"] = edicao
+        return edicao.audio
+
+    audio = cached_wav_bytes(rtttl_string, sample_rate, samples=editar)
+    edicao = st.session_state.get("edicao")
+    if edicao is not None and edicao.text != rtttl_string:
+        del st.session_state["edicao"]
+    with METRICS.span("app.audio"):
+        st.audio(audio, format="audio/wav")
+
+
+# Função para exibir visualização gráfica das notas: piano-roll pré-calculado
+# e guardado em cache por melodia, com número de pontos e rótulos limitado
+def plot_notes(rtttl_string):
+    import plotly.graph_objects as go  # só carregado quando há o que desenhar
+
+    with METRICS.span("app.plot"):
+        fig = go.Figure(cached_plot_spec(rtttl_string))
+        st.plotly_chart(fig)
 
 
 # Carregar melodia pré-definida ou entrada personalizada
 if melodia_selecionada != "Selecione...":
-    codigo_rtttl = melodias_predefinidas[melodia_selecionada]
+    codigo_rtttl = presets.rtttl(presets.find(melodia_selecionada)[0])
 else:
     codigo_rtttl = ""
 
@@ -155,34 +175,56 @@ codigo_rtttl = st.text_area(
 if codigo_rtttl:
     codigo_rtttl = codigo_rtttl.strip()
     try:
-        name, parsed_notes = parse_rtttl2(codigo_rtttl)
-        arduino_code = generate_arduino_code(name, parsed_notes)
+        melody = cached_melody(codigo_rtttl, preset_melody(codigo_rtttl))
         st.markdown(
             "<h2 style='color: #4CAF50;'>Código Arduino Gerado:</h2>",
             unsafe_allow_html=True,
         )
+        formatos = {
+            "Automático (menor uso de memória)": "auto",
+            "Arrays int na SRAM": "sram",
+            "Bytes em PROGMEM": "progmem",
+            "Bytes em PROGMEM com RLE": "progmem_rle",
+        }
+        formato = st.radio("Formato do código:", list(formatos), horizontal=True)
+        arduino_code, uso = cached_arduino_code(codigo_rtttl, formatos[formato])
+        st.caption(
+            f"Dados da melodia: {uso['flash_bytes']} bytes de flash, "
+            f"{uso['ram_bytes']} bytes de SRAM ({uso['encoding']})"
+        )
+        if "fallback" in uso:
+            st.warning(f"Gerado como arrays na SRAM: {uso['fallback']}")
         st.code(arduino_code, language="c")
 
         st.markdown(
             "<h2 style='color: #4CAF50;'>Visualização da Melodia:</h2>",
             unsafe_allow_html=True,
         )
-        plot_notes(parsed_notes)
+        plot_notes(codigo_rtttl)
 
-    except KeyError as ke:
-        st.error(f"Nota inválida encontrada: {ke}. Verifique o formato do RTTTL.")
-    except Exception as e:
-        st.error(f"Erro ao gerar código Arduino: {e}")
-
-    try:
         st.markdown(
-            f"<h2 style='color: #4CAF50;'>🎵 Tocar {codigo_rtttl.split(":")[0]}</h2>",
+            f"<h2 style='color: #4CAF50;'>🎵 Tocar {melody.name}</h2>",
             unsafe_allow_html=True,
         )
-        melody = parse_rtttl(codigo_rtttl)
-        play_melody(melody)
+        formas_de_onda = {
+            "Senoidal": "sine",
+            "Quadrada (piezo)": "square",
+            "Triangular": "triangle",
+            "Dente de serra": "saw",
+        }
+        forma = st.radio("Forma de onda:", list(formas_de_onda), horizontal=True)
+        outras_vozes = st.text_area(
+            "Outras vozes (opcional, um código RTTTL por linha):",
+            placeholder="Segunda voz para tocar junto, como um dueto",
+        )
+        outras_vozes = [voz.strip() for voz in outras_vozes.splitlines() if voz.strip()]
+        play_melody(
+            codigo_rtttl, waveform=formas_de_onda[forma], outras_vozes=outras_vozes
+        )
+    except ValueError as ve:
+        st.error(f"Erro ao interpretar RTTTL: {ve}")
     except Exception as e:
-        st.error(f"Erro ao tocar RTTTL: {e}")
+        st.error(f"Erro ao processar RTTTL: {e}")
 else:
     st.error("Insira um código RTTTL válido!")
 
@@ -212,3 +254,9 @@ st.markdown(
     """,
     unsafe_allow_html=True,
 )
+
+# Métricas por etapa, só quando a instrumentação está ligada (RTTTL_METRICS=1)
+if METRICS.enabled:
+    METRICS.record("app.rerun", time.perf_counter() - inicio_execucao)
+    with st.expander("Métricas de desempenho"):
+        st.code(METRICS.prometheus_text(), language="text")
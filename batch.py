@@ -0,0 +1,138 @@
+# Compilação em lote do acervo RTTTL: cada música vira uma pasta com o
+# sketch Arduino (.ino), o header só com os arrays (.h) e, opcionalmente, o
+# áudio (.wav). As músicas são distribuídas em lotes por um pool de
+# processos; uma música inválida é registrada no relatório e não interrompe
+# as demais.
+#
+# Uso: python batch.py rtttl_songs.txt -o build [--wav] [--workers N]
+#                      [--names NOME ...] [--limit N] [--encoding auto]
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from rtttl import (
+    arduino_identifier,
+    ARDUINO_ENCODINGS,
+    generate_arduino_code_for,
+    generate_arduino_header,
+    melody_to_arduino,
+    parse_melody,
+    write_wav,
+)
+
+
+def read_corpus(file_path, names=None, limit=None):
+    # Lista de (linha, rtttl); a linha do arquivo identifica músicas homônimas
+    songs = []
+    with open(file_path, "r") as file:
+        for index, line in enumerate(file):
+            line = line.strip()
+            if not line or (names and line.split(":")[0] not in names):
+                continue
+            songs.append((index, line))
+            if limit and len(songs) >= limit:
+                break
+    return songs
+
+
+def song_slug(index, name):
+    return f"{index:05d}_{arduino_identifier(name).lstrip('_')}"
+
+
+def compile_song(song, output_dir, wav=False, encoding="sram"):
+    index, rtttl_string = song
+    result = {"index": index, "name": rtttl_string.split(":")[0]}
+    try:
+        melody = parse_melody(rtttl_string)
+        notes = melody_to_arduino(melody)
+        slug = song_slug(index, melody.name)
+        song_dir = os.path.join(output_dir, slug)
+        os.makedirs(song_dir, exist_ok=True)
+
+        code, usage = generate_arduino_code_for(melody.name, notes, encoding)
+        with open(os.path.join(song_dir, slug + ".ino"), "w") as file:
+            file.write(code)
+        with open(os.path.join(song_dir, slug + ".h"), "w") as file:
+            file.write(generate_arduino_header(melody.name, notes))
+        if wav:
+            with open(os.path.join(song_dir, slug + ".wav"), "wb") as file:
+                write_wav(file, melody)
+    except Exception as e:
+        result.update(ok=False, error=f"{type(e).__name__}: {e}")
+    else:
+        result.update(ok=True, slug=slug, notes=len(notes), **usage)
+    return result
+
+
+def compile_corpus(
+    songs, output_dir, wav=False, workers=None, chunk_size=None, encoding="sram"
+):
+    workers = workers or os.cpu_count() or 1
+    # lotes grandes o bastante para diluir o custo de IPC, mas com folga
+    # para equilibrar a carga entre os processos
+    chunk_size = chunk_size or max(1, len(songs) // (workers * 8))
+    os.makedirs(output_dir, exist_ok=True)
+    task = partial(compile_song, output_dir=output_dir, wav=wav, encoding=encoding)
+
+    start = time.perf_counter()
+    if workers == 1:
+        results = list(map(task, songs))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(task, songs, chunksize=chunk_size))
+    elapsed = time.perf_counter() - start
+
+    failures = [result for result in results if not result["ok"]]
+    summary = {
+        "songs": len(results),
+        "compiled": len(results) - len(failures),
+        "failed": len(failures),
+        "workers": workers,
+        "chunk_size": chunk_size,
+        "wav": wav,
+        "encoding": encoding,
+        "flash_bytes": sum(result["flash_bytes"] for result in results if result["ok"]),
+        "ram_bytes": sum(result["ram_bytes"] for result in results if result["ok"]),
+        "elapsed_s": round(elapsed, 3),
+        "songs_per_s": round(len(results) / elapsed, 1) if elapsed else None,
+        "failures": failures,
+    }
+    with open(os.path.join(output_dir, "summary.json"), "w") as file:
+        json.dump(summary, file, indent=2, ensure_ascii=False)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compila o acervo RTTTL em lote")
+    parser.add_argument("file_path", nargs="?", default="rtttl_songs.txt")
+    parser.add_argument("-o", "--output", default="build")
+    parser.add_argument("--wav", action="store_true", help="gera também o áudio")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=None)
+    parser.add_argument("--names", nargs="*", help="compila só estas músicas")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument(
+        "--encoding",
+        choices=ARDUINO_ENCODINGS + ("auto",),
+        default="sram",
+        help="formato dos dados no sketch; auto escolhe o de menor uso de memória",
+    )
+    args = parser.parse_args()
+
+    songs = read_corpus(args.file_path, args.names, args.limit)
+    summary = compile_corpus(
+        songs, args.output, args.wav, args.workers, args.chunk_size, args.encoding
+    )
+    print(
+        f"{summary['compiled']}/{summary['songs']} músicas compiladas em "
+        f"{summary['elapsed_s']} s ({summary['songs_per_s']} músicas/s, "
+        f"{summary['workers']} processos); {summary['failed']} falhas em "
+        f"{os.path.join(args.output, 'summary.json')}"
+    )
+
+
+if __name__ == "__main__":
+    main()
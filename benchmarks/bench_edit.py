@@ -0,0 +1,63 @@
+# Mede a edição ao vivo (edit_melody) contra interpretar e renderizar a
+# melodia inteira de novo, trocando um token por vez em músicas do acervo.
+#
+# Uso: python benchmarks/bench_edit.py [rtttl_songs.txt]
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from rtttl import edit_melody, parse_melody, render_melody  # noqa: E402
+
+EDITS = ["8c", "16d#6", "p", "4a.", "2g_5", "32b"]
+
+
+def edited_versions(song, count, rng):
+    name, defaults, notes = song.split(":")
+    tokens = notes.split(",")
+    for _ in range(count):
+        tokens[rng.randrange(len(tokens))] = rng.choice(EDITS)
+        yield ":".join([name, defaults, ",".join(tokens)])
+
+
+def longest_songs(path, count):
+    melodies = []
+    with open(path, "r") as file:
+        for line in file:
+            try:
+                melodies.append((len(parse_melody(line).midi), line.strip()))
+            except ValueError:
+                continue
+    melodies.sort()
+    return [song for _, song in melodies[-count:]]
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "rtttl_songs.txt"
+    rng = random.Random(0)
+    incremental = full = 0.0
+    rendered = total = edits = 0
+    for song in longest_songs(path, 50):
+        state = edit_melody(None, song)
+        for version in edited_versions(song, 20, rng):
+            start = time.perf_counter()
+            state = edit_melody(state, version)
+            incremental += time.perf_counter() - start
+
+            start = time.perf_counter()
+            audio = render_melody(parse_melody(version))
+            full += time.perf_counter() - start
+
+            assert np.array_equal(audio, state.audio)
+            rendered += state.rendered
+            total += len(audio)
+            edits += 1
+
+    print(f"edições: {edits} (50 músicas mais longas do acervo)")
+    print(f"refazendo tudo: {full / edits * 1e3:.3f} ms/edição")
+    print(f"edit_melody:    {incremental / edits * 1e3:.3f} ms/edição")
+    print(f"amostras renderizadas: {rendered / total:.1%} do total")
@@ -0,0 +1,137 @@
+# Compara o parser de passada única (parse_melody + visões) com o par antigo
+# parse_rtttl2 + parse_rtttl que o App.py chamava para cada melodia.
+#
+# Uso: python benchmarks/bench_parse.py [rtttl_songs.txt]
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from rtttl import (  # noqa: E402
+    NOTE_FREQUENCIES,
+    melody_note_names,
+    melody_to_arduino,
+    melody_to_audio,
+    parse_melody,
+)
+
+
+# Cópias fiéis das implementações anteriores, usadas apenas como referência
+def legacy_parse_rtttl(rtttl):
+    name, settings, melody = rtttl.split(":")
+    settings = dict(item.split("=") for item in settings.split(","))
+    default_duration = int(settings.get("d", 4))
+    default_octave = int(settings.get("o", 5))
+    bpm = int(settings.get("b", 63))
+
+    beat_duration = 60 / bpm * 4
+    melody = re.findall(r"(\d*)([a-gp#]+)(\d*)(\.*)", melody, re.IGNORECASE)
+
+    parsed_melody = []
+    for duration, note, octave, dot in melody:
+        duration = int(duration) if duration else default_duration
+        octave = int(octave) if octave else default_octave
+        duration_factor = 1.5 if dot else 1
+        note_duration = beat_duration / duration * duration_factor
+        note = note.replace(".", "")
+        freq = (
+            0 if note == "p" else NOTE_FREQUENCIES[note.lower()] * (2 ** (octave - 4))
+        )
+        parsed_melody.append((freq, note_duration))
+    return parsed_melody
+
+
+def legacy_parse_rtttl2(rtttl_string):
+    sections = rtttl_string.split(":")
+    if len(sections) != 3:
+        raise ValueError("Formato RTTTL inválido.")
+
+    name, defaults, notes = sections
+    default_settings = {}
+    for item in defaults.split(","):
+        key, value = item.split("=")
+        default_settings[key] = int(value)
+
+    default_duration = default_settings.get("d", 4)
+    default_octave = default_settings.get("o", 6)
+    bpm = default_settings.get("b", 63)
+    ms_per_beat = 60000 / bpm
+
+    note_pattern = re.compile(r"(?:(\d+)?)([a-gpA-GP])(#?)(\d*)")
+    parsed_notes = []
+    for match in note_pattern.finditer(notes):
+        duration, note, sharp, octave = match.groups()
+        duration = int(duration) if duration else default_duration
+        octave = int(octave) if octave else default_octave
+        if note.lower() == "p":
+            frequency = 0
+        else:
+            note_frequencies = {
+                "c": 16.35,
+                "d": 18.35,
+                "e": 20.60,
+                "f": 21.83,
+                "g": 24.50,
+                "a": 27.50,
+                "b": 30.87,
+            }
+            frequency = note_frequencies[note.lower()] * (2 ** (octave - 4))
+            if sharp:
+                frequency *= 2 ** (1 / 12)
+        note_duration = ms_per_beat * (4 / duration)
+        parsed_notes.append((int(frequency * 9), int(note_duration)))
+    return name, parsed_notes
+
+
+def legacy_pair(song):
+    legacy_parse_rtttl2(song)
+    legacy_parse_rtttl(song)
+
+
+def single_pass(song):
+    melody = parse_melody(song)
+    melody_to_arduino(melody)
+    melody_to_audio(melody)
+    melody_note_names(melody)
+
+
+def load_corpus(path):
+    with open(path, "r") as file:
+        songs = [line.strip() for line in file if line.strip()]
+    # só entram as músicas que as duas implementações conseguem ler
+    valid = []
+    for song in songs:
+        try:
+            legacy_pair(song)
+            single_pass(song)
+        except Exception:
+            continue
+        valid.append(song)
+    return valid
+
+
+def bench(func, songs, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for song in songs:
+            func(song)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "rtttl_songs.txt"
+    songs = load_corpus(path)
+    legacy = bench(legacy_pair, songs)
+    new = bench(single_pass, songs)
+    print(f"músicas: {len(songs)}")
+    print(
+        f"parse_rtttl2 + parse_rtttl: {legacy:.3f} s ({legacy / len(songs) * 1e6:.1f} us/música)"
+    )
+    print(
+        f"parse_melody + visões:      {new:.3f} s ({new / len(songs) * 1e6:.1f} us/música)"
+    )
+    print(f"speedup: {legacy / new:.2f}x")
@@ -0,0 +1,130 @@
+# Teste de carga do service.py: N conexões keep-alive concorrentes enviam
+# músicas do acervo para um endpoint e medimos vazão e latência p50/p99.
+# Com --spawn o próprio script sobe o serviço numa porta livre.
+#
+# Uso: python benchmarks/bench_service.py [rtttl_songs.txt] --spawn
+#          [--endpoint arduino|notes|wav] [--concurrency 64] [--requests 5000]
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+
+
+def load_songs(path, limit):
+    with open(path, "r") as file:
+        songs = [line.strip().encode() for line in file if line.strip()]
+    return songs[:limit]
+
+
+async def read_response(reader):
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        key, _, value = line.decode("latin-1").partition(":")
+        if key.lower() == "content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+
+async def client(host, port, target, songs, counter, total, latencies, statuses):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while counter[0] < total:
+            song = songs[counter[0] % len(songs)]
+            counter[0] += 1
+            request = (
+                f"POST {target} HTTP/1.1\r\nHost: {host}\r\n"
+                f"Content-Length: {len(song)}\r\n\r\n"
+            ).encode() + song
+            start = time.perf_counter()
+            writer.write(request)
+            status = await read_response(reader)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def load_test(host, port, target, songs, concurrency, total):
+    counter, latencies, statuses = [0], [], {}
+    start = time.perf_counter()
+    await asyncio.gather(
+        *[
+            client(host, port, target, songs, counter, total, latencies, statuses)
+            for _ in range(concurrency)
+        ]
+    )
+    elapsed = time.perf_counter() - start
+    latencies = np.array(latencies) * 1000
+    print(f"{target}: {len(latencies)} pedidos em {elapsed:.2f} s")
+    print(f"  {len(latencies) / elapsed:.1f} pedidos/s, status {statuses}")
+    print(
+        f"  latência p50 {np.percentile(latencies, 50):.2f} ms, "
+        f"p99 {np.percentile(latencies, 99):.2f} ms"
+    )
+
+
+def spawn_service(args):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    command = [sys.executable, os.path.join(ROOT, "service.py"), "--port", str(port)]
+    if args.workers:
+        command += ["--workers", str(args.workers)]
+    process = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            break
+        except OSError:
+            time.sleep(0.1)
+    return process, port
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do service.py")
+    parser.add_argument("file_path", nargs="?", default="rtttl_songs.txt")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--spawn", action="store_true", help="sobe o serviço")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--endpoint", default="arduino")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--songs", type=int, default=2000, help="músicas distintas")
+    args = parser.parse_args()
+
+    songs = load_songs(args.file_path, args.songs)
+    process = None
+    if args.spawn:
+        process, args.port = spawn_service(args)
+    try:
+        asyncio.run(
+            load_test(
+                args.host,
+                args.port,
+                "/" + args.endpoint,
+                songs,
+                args.concurrency,
+                args.requests,
+            )
+        )
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+# Perfil de inicialização: tempo de import de cada dependência e o tempo até
+# a primeira renderização do App.py, sempre em processos novos (partida a
+# frio). A primeira renderização é medida com e sem os artefatos
+# pré-interpretados (rtttl_songs.bin/.idx.json, presets.bin/.idx.json); sem
+# eles o acervo é reconstruído a partir do texto, como antes.
+#
+# Uso: python benchmarks/bench_startup.py [--repeat 5] [-o startup.json]
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# O que o App.py importava na partida e o que importa agora; plotly passou a
+# ser carregado só no primeiro gráfico
+EAGER_IMPORTS = [
+    "streamlit",
+    "pandas",
+    "scipy.io.wavfile",
+    "plotly.graph_objects",
+    "numpy",
+    "tempfile",
+    "rtttl",
+]
+LAZY_IMPORTS = ["streamlit", "rtttl", "song_store"]
+
+IMPORT_SCRIPT = """
+import importlib, json, sys, time
+start = time.perf_counter()
+for name in sys.argv[1:]:
+    importlib.import_module(name)
+print(json.dumps(time.perf_counter() - start))
+"""
+
+# O trabalho da primeira execução do App.py, sem o streamlit: abrir acervo e
+# presets, mostrar a primeira página e converter o primeiro preset
+FIRST_RENDER_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+steps = {}
+
+def step(name):
+    steps[name] = round((time.perf_counter() - start) * 1000, 2)
+
+from rtttl import (cached_arduino_code, cached_melody, cached_plot_spec,
+                   cached_wav_bytes, edit_melody)
+from song_store import open_store
+step("import")
+store = open_store("rtttl_songs.txt")
+store.page(0)
+step("catalog")
+presets = open_store("presets.txt")
+text = presets.rtttl(0)
+melody = cached_melody(text, presets.melody(0))
+step("preset")
+cached_arduino_code(text)
+cached_plot_spec(text)
+step("arduino_plot")
+state = edit_melody(None, text)
+cached_wav_bytes(text, samples=state.audio)
+step("audio")
+print(json.dumps(steps))
+"""
+
+
+def run_python(script, args=(), cwd=ROOT):
+    result = subprocess.run(
+        [sys.executable, "-c", script, *args],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode:
+        return None
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def installed(modules):
+    return [name for name in modules if run_python(IMPORT_SCRIPT, [name])]
+
+
+def import_time(modules, repeat):
+    # melhor de N partidas a frio, em ms; None se algum módulo não existe
+    times = [run_python(IMPORT_SCRIPT, modules) for _ in range(repeat)]
+    if None in times:
+        return None
+    return round(min(times) * 1000, 2)
+
+
+def first_render(artifacts, repeat):
+    best = None
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as workdir:
+            for name in ("rtttl.py", "song_store.py", "rtttl_songs.txt", "presets.txt"):
+                shutil.copy(os.path.join(ROOT, name), workdir)
+            if artifacts:
+                for name in ("rtttl_songs", "presets"):
+                    for suffix in (".bin", ".idx.json"):
+                        source = os.path.join(ROOT, name + suffix)
+                        if os.path.exists(source):
+                            shutil.copy(source, workdir)
+            steps = run_python(FIRST_RENDER_SCRIPT, cwd=workdir)
+        if steps and (best is None or steps["audio"] < best["audio"]):
+            best = steps
+    return best
+
+
+def app_test(repeat):
+    # execução completa do App.py pelo AppTest do streamlit, se instalado
+    script = """
+import json, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+AppTest.from_file("App.py", default_timeout=60).run()
+print(json.dumps(time.perf_counter() - start))
+"""
+    times = [run_python(script) for _ in range(repeat)]
+    if None in times:
+        return None
+    return round(min(times) * 1000, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perfil de inicialização")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("-o", "--output", help="grava o resultado em JSON")
+    args = parser.parse_args()
+
+    modules = sorted(set(EAGER_IMPORTS + LAZY_IMPORTS))
+    results = {
+        "imports_ms": {name: import_time([name], args.repeat) for name in modules},
+        "app_imports_ms": {
+            "eager": import_time(installed(EAGER_IMPORTS), args.repeat),
+            "lazy": import_time(installed(LAZY_IMPORTS), args.repeat),
+        },
+        "first_render_ms": {
+            "with_artifacts": first_render(True, args.repeat),
+            "without_artifacts": first_render(False, args.repeat),
+        },
+        "app_test_ms": app_test(args.repeat),
+    }
+
+    print("import (ms, partida a frio):")
+    for name, elapsed in results["imports_ms"].items():
+        print(f"  {name:22s} {'não instalado' if elapsed is None else elapsed}")
+    print("imports do App.py (ms; módulos ausentes ficam de fora):")
+    for mode, elapsed in results["app_imports_ms"].items():
+        print(f"  {mode:22s} {elapsed}")
+    print("primeira renderização (ms acumulados por etapa):")
+    for mode, steps in results["first_render_ms"].items():
+        print(f"  {mode:22s} {steps}")
+    app_ms = results["app_test_ms"]
+    print(
+        f"AppTest do App.py: {'streamlit indisponível' if app_ms is None else app_ms}"
+    )
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
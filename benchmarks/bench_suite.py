@@ -0,0 +1,227 @@
+# Suíte de benchmarks sobre o acervo real (rtttl_songs.txt): mede
+# parse_rtttl, parse_rtttl2, a síntese com generate_tone e com render_melody,
+# generate_arduino_code e freq_to_note_name no acervo inteiro e em faixas de
+# tamanho (número de notas). Para cada carga e faixa registra a vazão, a
+# latência p50/p99 por música e o pico de memória, e grava tudo em JSON para
+# comparar execuções entre commits.
+#
+# Uso: python benchmarks/bench_suite.py [rtttl_songs.txt] [-o resultado.json]
+#          [--only parse_rtttl ...] [--repeat 3] [--synth-limit 200]
+#          [--compare base.json]
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from rtttl import (  # noqa: E402
+    freq_to_note_name,
+    generate_arduino_code,
+    generate_tone,
+    melody_to_audio,
+    parse_melody,
+    parse_rtttl,
+    parse_rtttl2,
+    render_melody,
+)
+
+# Faixas por número de notas; os limites ficam fixos para que os resultados
+# de commits diferentes sejam comparáveis
+BUCKETS = [("short", 0, 32), ("medium", 33, 64), ("long", 65, None)]
+
+
+def synth_generate_tone(melody):
+    # o caminho antigo do App.py: um generate_tone por nota e concatenação
+    audio = np.concatenate(
+        [generate_tone(freq, duration) for freq, duration in melody_to_audio(melody)]
+    )
+    return (audio * 32767).astype(np.int16)
+
+
+# nome: (entrada preparada a partir da música, função medida, é síntese?)
+WORKLOADS = {
+    "parse_rtttl": (lambda song: song["text"], parse_rtttl, False),
+    "parse_rtttl2": (lambda song: song["text"], parse_rtttl2, False),
+    "synth_generate_tone": (lambda song: song["melody"], synth_generate_tone, True),
+    "render_melody": (lambda song: song["melody"], render_melody, True),
+    "generate_arduino_code": (
+        lambda song: parse_rtttl2(song["text"]),
+        lambda args: generate_arduino_code(*args),
+        False,
+    ),
+    "freq_to_note_name": (
+        lambda song: [freq for freq, _ in parse_rtttl(song["text"])],
+        freq_to_note_name,
+        False,
+    ),
+}
+
+
+def load_corpus(path):
+    # só entram as músicas que o parser consegue ler
+    songs = []
+    with open(path, "r") as file:
+        for line in file:
+            text = line.strip()
+            try:
+                melody = parse_melody(text)
+            except ValueError:
+                continue
+            if len(melody.midi):
+                songs.append(
+                    {"text": text, "melody": melody, "notes": len(melody.midi)}
+                )
+    return songs
+
+
+def bucket_songs(songs):
+    buckets = {"all": songs}
+    for name, low, high in BUCKETS:
+        buckets[name] = [
+            song
+            for song in songs
+            if song["notes"] >= low and (high is None or song["notes"] <= high)
+        ]
+    return buckets
+
+
+def spread(songs, limit):
+    # amostra determinística e espalhada pela faixa inteira
+    if limit is None or len(songs) <= limit:
+        return songs
+    step = len(songs) / limit
+    return [songs[int(i * step)] for i in range(limit)]
+
+
+def measure(func, inputs, repeat):
+    # latência de cada música é a melhor entre as repetições; a vazão usa a
+    # melhor passada completa
+    latencies = np.full(len(inputs), np.inf)
+    best_pass = float("inf")
+    for _ in range(repeat):
+        pass_start = time.perf_counter()
+        for i, item in enumerate(inputs):
+            start = time.perf_counter()
+            func(item)
+            latencies[i] = min(latencies[i], time.perf_counter() - start)
+        best_pass = min(best_pass, time.perf_counter() - pass_start)
+
+    # pico de memória numa passada separada, porque o tracemalloc pesa no
+    # tempo medido
+    tracemalloc.start()
+    for item in inputs:
+        func(item)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best_pass, latencies, peak
+
+
+def run_workload(name, buckets, repeat, synth_limit):
+    prepare, func, synth = WORKLOADS[name]
+    results = {}
+    for bucket, songs in buckets.items():
+        songs = spread(songs, synth_limit if synth else None)
+        if not songs:
+            continue
+        inputs = [prepare(song) for song in songs]
+        func(inputs[0])  # aquece caches e importações
+        elapsed, latencies, peak = measure(func, inputs, repeat)
+        notes = sum(song["notes"] for song in songs)
+        results[bucket] = {
+            "songs": len(songs),
+            "notes": notes,
+            "total_s": round(elapsed, 6),
+            "songs_per_s": round(len(songs) / elapsed, 1),
+            "notes_per_s": round(notes / elapsed, 1),
+            "p50_us": round(float(np.percentile(latencies, 50)) * 1e6, 2),
+            "p99_us": round(float(np.percentile(latencies, 99)) * 1e6, 2),
+            "peak_bytes": peak,
+        }
+    return results
+
+
+def environment(path):
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "corpus": os.path.basename(path),
+    }
+
+
+def compare(results, baseline):
+    # razão de vazão atual/base: abaixo de 1 é regressão
+    print(f"\ncomparação com {baseline['env'].get('commit')}:")
+    for name, buckets in results["workloads"].items():
+        for bucket, stats in buckets.items():
+            base = baseline["workloads"].get(name, {}).get(bucket)
+            if base:
+                ratio = stats["songs_per_s"] / base["songs_per_s"]
+                print(f"  {name:22s} {bucket:7s} {ratio:6.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks sobre o acervo RTTTL")
+    parser.add_argument("file_path", nargs="?", default="rtttl_songs.txt")
+    parser.add_argument("-o", "--output", default="bench_results.json")
+    parser.add_argument("--only", nargs="*", choices=list(WORKLOADS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--synth-limit",
+        type=int,
+        default=200,
+        help="músicas por faixa nas cargas de síntese (0 para todas)",
+    )
+    parser.add_argument("--compare", help="JSON de uma execução anterior")
+    args = parser.parse_args()
+
+    songs = load_corpus(args.file_path)
+    buckets = bucket_songs(songs)
+    results = {
+        "env": environment(args.file_path),
+        "repeat": args.repeat,
+        "buckets": {name: [low, high] for name, low, high in BUCKETS},
+        "workloads": {},
+    }
+    for name in args.only or WORKLOADS:
+        results["workloads"][name] = run_workload(
+            name, buckets, args.repeat, args.synth_limit or None
+        )
+        for bucket, stats in results["workloads"][name].items():
+            print(
+                f"{name:22s} {bucket:7s} {stats['songs']:6d} músicas "
+                f"{stats['songs_per_s']:10.1f} músicas/s "
+                f"p50 {stats['p50_us']:9.1f} us p99 {stats['p99_us']:9.1f} us "
+                f"pico {stats['peak_bytes'] / 1e6:7.2f} MB"
+            )
+
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2, ensure_ascii=False)
+    print(f"resultados em {args.output}")
+    if args.compare:
+        with open(args.compare, "r") as file:
+            compare(results, json.load(file))
+
+
+if __name__ == "__main__":
+    main()
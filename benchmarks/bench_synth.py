@@ -0,0 +1,96 @@
+# Compara o sintetizador vetorizado (render_melody) com o caminho antigo do
+# App.py: generate_tone por nota + np.concatenate + conversão para int16, e
+# mede a mistura de 4 vozes (render_mix) contra o tempo real.
+#
+# Uso: python benchmarks/bench_synth.py [rtttl_songs.txt]
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import rtttl  # noqa: E402
+from rtttl import (  # noqa: E402
+    WAVEFORMS,
+    generate_tone,
+    melody_durations,
+    melody_to_audio,
+    parse_melody,
+    render_melody,
+    render_mix,
+)
+
+MISSION_IMPOSSIBLE = (
+    "Mission Impossible:d=16,o=6,b=95:32d,32d#,32d,32d#,32d,32d#,32d,32d#,32d,"
+    "32d,32d#,32e,32f,32f#,32g,g,8p,g,8p,a#,p,c7,p,g,8p,g,8p,f,p,f#,p,g,8p,g,8p,"
+    "a#,p,c7,p,g,8p,g,8p,f,p,f#,p,a#,g,2d,32p,a#,g,2c#,32p,a#,g,2c,a#5,8c,2p,32p,"
+    "a#5,g5,2f#,32p,a#5,g5,2f,32p,a#5,g5,2e,d#,8d"
+)
+
+
+def legacy_render(melody, sample_rate=44100):
+    audio = np.concatenate(
+        [
+            generate_tone(freq, duration, sample_rate)
+            for freq, duration in melody_to_audio(melody)
+        ]
+    )
+    return (audio * 32767).astype(np.int16)
+
+
+def measure(func, melody, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        rtttl._LOOP_CACHE.clear()  # mede sempre com o cache de laços frio
+        start = time.perf_counter()
+        func(melody)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    func(melody)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+def longest_songs(path, count):
+    melodies = []
+    with open(path, "r") as file:
+        for line in file:
+            try:
+                melodies.append(parse_melody(line))
+            except ValueError:
+                continue
+    melodies.sort(key=lambda melody: int(melody.onset[-1]) if len(melody.onset) else 0)
+    return melodies[-count:]
+
+
+def report(melody):
+    legacy_time, legacy_peak = measure(legacy_render, melody)
+    new_time, new_peak = measure(render_melody, melody)
+    audio_bytes = render_melody(melody).nbytes
+    print(f"{melody.name} ({len(melody.midi)} notas, {audio_bytes / 1e6:.1f} MB PCM)")
+    print(
+        f"  generate_tone: {legacy_time * 1000:8.2f} ms, pico {legacy_peak / 1e6:6.1f} MB"
+    )
+    print(f"  render_melody: {new_time * 1000:8.2f} ms, pico {new_peak / 1e6:6.1f} MB")
+    print(f"  speedup: {legacy_time / new_time:.1f}x")
+
+
+def report_mix(melody):
+    # as quatro formas de onda tocando a mesma melodia ao mesmo tempo
+    voices = [(melody, waveform) for waveform in WAVEFORMS]
+    elapsed, peak = measure(render_mix, voices)
+    duration = float(melody_durations(melody).sum())
+    print(f"  render_mix, 4 vozes: {elapsed * 1000:8.2f} ms, pico {peak / 1e6:6.1f} MB")
+    print(f"  {duration / elapsed:.0f}x mais rápido que o tempo real")
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "rtttl_songs.txt"
+    report(parse_melody(MISSION_IMPOSSIBLE))
+    for melody in longest_songs(path, 3):
+        report(melody)
+        report_mix(melody)
@@ -1,5 +1,16 @@
+import contextlib
+import functools
+import hashlib
+import io
+import json
 import numpy as np
+import os
 import re
+import struct
+import sys
+import threading
+import time
+from collections import OrderedDict, namedtuple
 
 # Função para converter notas em frequências
 NOTE_FREQUENCIES = {
@@ -25,38 +36,321 @@ def note_to_freq(note, octave):
     return NOTE_FREQUENCIES[note.lower()] * (2 ** (octave - 4))
 
 
-def parse_rtttl(rtttl):
-    name, settings, melody = rtttl.split(":")
-    settings = dict(item.split("=") for item in settings.split(","))
-    default_duration = int(settings.get("d", 4))
-    default_octave = int(settings.get("o", 5))
-    bpm = int(settings.get("b", 63))
-
-    beat_duration = 60 / bpm * 4  # Duration of a whole note in seconds
-    melody = re.findall(r"(\d*)([a-gp#]+)(\d*)(\.*)", melody, re.IGNORECASE)
-
-    parsed_melody = []
-    for duration, note, octave, dot in melody:
-        duration = int(duration) if duration else default_duration
-        octave = int(octave) if octave else default_octave
-        duration_factor = 1.5 if dot else 1
-        note_duration = beat_duration / duration * duration_factor
-        note = note.replace(".", "")  # Remove dots from note names for processing
-        freq = note_to_freq(note, octave)
-        parsed_melody.append((freq, note_duration))
-    return parsed_melody
+# Instrumentação opcional: spans de tempo e contadores por etapa (parse,
+# síntese, escrita de WAV, geração de código, gráfico), exportáveis como
+# logs estruturados (um dict por span para o sink) ou texto no formato do
+# Prometheus. Desligada por padrão; ligada com METRICS.enable() ou com a
+# variável de ambiente RTTTL_METRICS=1 ou =true (ou =log para também emitir
+# cada span como uma linha JSON no stderr); 0, false ou vazio a deixam
+# desligada. Desligada, cada ponto instrumentado custa só a checagem de
+# METRICS.enabled.
+class _Span:
+    __slots__ = ("metrics", "stage", "start")
 
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
 
-def generate_tone(freq, duration, sample_rate=44100):
-    if freq == 0:  # Pause
-        return np.zeros(int(sample_rate * duration))
-    t = np.linspace(0, duration, int(sample_rate * duration), False)
-    wave = 0.5 * np.sin(2 * np.pi * freq * t)
-    return wave
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.record(self.stage, time.perf_counter() - self.start)
+
+
+_NO_SPAN = contextlib.nullcontext()
+
+
+class Metrics:
+    def __init__(self):
+        self.enabled = False
+        self.sink = None
+        self._lock = threading.Lock()
+        self.reset()
+
+    def enable(self, sink=None):
+        # sink: chamado com {"stage", "seconds", "time"} ao fim de cada span
+        self.sink = sink
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            self.spans = {}  # etapa -> [quantidade, soma, máximo] em segundos
+
+    def count(self, name, value=1):
+        if self.enabled:
+            with self._lock:
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def span(self, stage):
+        return _Span(self, stage) if self.enabled else _NO_SPAN
+
+    def record(self, stage, seconds):
+        with self._lock:
+            stats = self.spans.get(stage)
+            if stats is None:
+                self.spans[stage] = [1, seconds, seconds]
+            else:
+                stats[0] += 1
+                stats[1] += seconds
+                stats[2] = max(stats[2], seconds)
+        if self.sink is not None:
+            self.sink({"stage": stage, "seconds": seconds, "time": time.time()})
+
+    def snapshot(self):
+        with self._lock:
+            spans = {
+                stage: {"count": count, "total_s": total, "max_s": peak}
+                for stage, (count, total, peak) in self.spans.items()
+            }
+            return {"spans": spans, "counters": dict(self.counters)}
+
+    def prometheus_text(self, prefix="rtttl"):
+        snapshot = self.snapshot()
+        lines = [f"# TYPE {prefix}_stage_seconds summary"]
+        for stage, stats in sorted(snapshot["spans"].items()):
+            label = f'{{stage="{stage}"}}'
+            lines.append(f"{prefix}_stage_seconds_count{label} {stats['count']}")
+            lines.append(f"{prefix}_stage_seconds_sum{label} {stats['total_s']:.6f}")
+        lines.append(f"# TYPE {prefix}_stage_seconds_max gauge")
+        for stage, stats in sorted(snapshot["spans"].items()):
+            label = f'{{stage="{stage}"}}'
+            lines.append(f"{prefix}_stage_seconds_max{label} {stats['max_s']:.6f}")
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+        # o cache de resultados já conta acertos e faltas por conta própria
+        cache = RESULT_CACHE.stats()
+        for name in ("hits", "misses", "evictions"):
+            lines.append(f"# TYPE {prefix}_cache_{name}_total counter")
+            lines.append(f"{prefix}_cache_{name}_total {cache[name]}")
+        lines.append(f"# TYPE {prefix}_cache_bytes gauge")
+        lines.append(f"{prefix}_cache_bytes {cache['bytes']}")
+        return "\n".join(lines) + "\n"
+
+
+def json_log_sink(stream=None):
+    # sink para Metrics.enable que escreve cada span como uma linha JSON
+    def sink(event):
+        print(json.dumps(event), file=stream or sys.stderr, flush=True)
+
+    return sink
+
+
+def timed(stage):
+    # Decorador: mede a função como um span da etapa quando METRICS está
+    # ligado; desligado, só repassa a chamada
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not METRICS.enabled:
+                return func(*args, **kwargs)
+            with _Span(METRICS, stage):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+METRICS = Metrics()
+_METRICS_MODE = os.environ.get("RTTTL_METRICS", "").strip().lower()
+if _METRICS_MODE in ("1", "true", "log"):
+    METRICS.enable(json_log_sink() if _METRICS_MODE == "log" else None)
+
+
+# Representação intermediária compartilhada, em colunas NumPy (uma posição
+# por nota): altura MIDI (PAUSE nas pausas), duração e início em ticks e se
+# a nota é pontuada. As saídas para Arduino, áudio e gráfico são visões
+# vetorizadas sobre ela.
+Melody = namedtuple("Melody", ["name", "bpm", "midi", "ticks", "onset", "dotted"])
+
+PAUSE = -1
+NOTE_NAMES = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
+# 384 é divisível por todas as durações usuais (1 a 64) e também por tercinas
+TICKS_PER_WHOLE = 384
+
+# Padrões do RTTTL (especificação Nokia)
+DEFAULT_DURATION = 4
+DEFAULT_OCTAVE = 6
+DEFAULT_BPM = 63
+
+# parse_rtttl2 usava a tabela da oitava 0 multiplicada por 2 ** (oitava - 4),
+# ou seja freq / 16, e Luciano adicionou * 9 para aumentar o volume
+ARDUINO_FREQ_SCALE = 9 / 16
+
+_PITCH_CLASSES = {"c": 0, "d": 2, "e": 4, "f": 5, "g": 7, "a": 9, "b": 11, "h": 11}
+# maior altura possível: si da oitava 9 com sustenido (b#9)
+_MIDI_RANGE = 12 * 11 + 1
+# Rótulo com oitava (notação científica, A4 = MIDI 69 = 440 Hz) indexado pela
+# altura MIDI; o índice PAUSE (-1) cai em "Pause"
+_PITCH_LABELS = np.array(
+    [f"{NOTE_NAMES[midi % 12]}{midi // 12 - 1}" for midi in range(_MIDI_RANGE)]
+    + ["Pause"]
+)
+
+# Um único token: duração, sustenido prefixado (#c), nota (h = si),
+# sustenido (# ou _), ponto antes ou depois da oitava
+_NOTE_TOKEN = re.compile(
+    r"\s*(\d*)\s*(#?)([a-hp])([#_]?)(\.?)(\d*)(\.?)\s*", re.IGNORECASE
+)
+
+
+def _parse_defaults(defaults):
+    settings = {"d": DEFAULT_DURATION, "o": DEFAULT_OCTAVE, "b": DEFAULT_BPM}
+    for item in defaults.split(","):
+        if not item.strip():
+            continue
+        key, value = item.split("=")
+        key = key.strip().lower()
+        if key in settings:
+            settings[key] = int(value)
+    if settings["d"] <= 0 or settings["b"] <= 0:
+        raise ValueError("Formato RTTTL inválido.")
+    # o= fora de 0..9 é limitado como a oitava de cada nota; sem isso a
+    # altura MIDI sai da tabela de rótulos e laços (ou vira PAUSE)
+    settings["o"] = min(max(settings["o"], 0), 9)
+    return settings
+
+
+def _parse_note(token, default_duration, default_octave):
+    match = _NOTE_TOKEN.fullmatch(token)
+    if match is None:
+        return None  # tokens vazios ou desconhecidos são ignorados
+    duration, prefix_sharp, note, sharp, dot, octave, dot_after = match.groups()
+    duration = int(duration) if duration and int(duration) > 0 else default_duration
+    dotted = bool(dot or dot_after)
+    ticks = max(1, round(TICKS_PER_WHOLE / duration))
+    if dotted:
+        ticks += ticks // 2
+
+    note = note.lower()
+    if note == "p":
+        return (PAUSE, ticks, dotted)
+    # oitavas absurdas do acervo (ex.: 88) são limitadas para caber em int16
+    octave = min(int(octave), 9) if octave else default_octave
+    midi = 12 * (octave + 1) + _PITCH_CLASSES[note] + bool(prefix_sharp or sharp)
+    return (midi, ticks, dotted)
+
+
+# O vocabulário de tokens do acervo é pequeno (poucos milhares), então cada
+# token distinto é interpretado pela regex uma única vez
+_NOTE_CACHE = {}
+_NOTE_CACHE_SIZE = 8192
+
+
+def melody_from_columns(name, bpm, midi, ticks, dotted):
+    ticks = np.asarray(ticks, dtype=np.int16)
+    onset = np.zeros(len(ticks), dtype=np.int32)
+    np.cumsum(ticks[:-1], out=onset[1:])
+    return Melody(
+        name,
+        bpm,
+        np.asarray(midi, dtype=np.int16),
+        ticks,
+        onset,
+        np.asarray(dotted, dtype=bool),
+    )
+
+
+@timed("parse")
+def parse_melody(rtttl_string):
+    sections = rtttl_string.strip().split(":")
+    if len(sections) != 3:
+        raise ValueError("Formato RTTTL inválido.")
+
+    name, defaults, notes = sections
+    try:
+        settings = _parse_defaults(defaults)
+    except ValueError:
+        raise ValueError("Formato RTTTL inválido.") from None
+
+    default_duration = settings["d"]
+    default_octave = settings["o"]
+
+    parsed_notes = _parse_tokens(notes.split(","), default_duration, default_octave)
+    melody = _melody_from_notes(
+        name, settings["b"], [note for note in parsed_notes if note]
+    )
+    METRICS.count("notes_parsed", len(melody.midi))
+    return melody
+
+
+def _parse_tokens(tokens, default_duration, default_octave):
+    # Uma entrada por token: (midi, ticks, dotted), ou None se for inválido
+    if len(_NOTE_CACHE) > _NOTE_CACHE_SIZE:
+        _NOTE_CACHE.clear()
+
+    parsed_notes = []
+    for token in tokens:
+        key = (token, default_duration, default_octave)
+        note = _NOTE_CACHE.get(key)
+        if note is None:
+            note = _NOTE_CACHE[key] = _parse_note(
+                token, default_duration, default_octave
+            )
+        parsed_notes.append(note)
+    return parsed_notes
+
+
+def _melody_from_notes(name, bpm, notes):
+    if notes:
+        midi, ticks, dotted = zip(*notes)
+    else:
+        midi, ticks, dotted = (), (), ()
+    return melody_from_columns(name, bpm, midi, ticks, dotted)
+
+
+def melody_frequencies(melody):
+    # Uma única expressão vetorizada; pausas ficam com frequência 0
+    frequencies = 440.0 * 2 ** ((melody.midi.astype(np.float32) - 69) / 12)
+    frequencies[melody.midi == PAUSE] = 0
+    return frequencies.astype(np.float32)
+
+
+def melody_durations(melody, unit=1.0):
+    # unit = 1.0 para segundos, 1000.0 para milissegundos
+    return melody.ticks * np.float32(240 * unit / melody.bpm / TICKS_PER_WHOLE)
+
+
+def melody_onsets(melody, unit=1.0):
+    return melody.onset * np.float32(240 * unit / melody.bpm / TICKS_PER_WHOLE)
+
+
+def melody_name_index(melody):
+    # Índice em NOTE_NAMES (0-11), ou PAUSE
+    return np.where(melody.midi == PAUSE, PAUSE, melody.midi % 12).astype(np.int16)
+
+
+def melody_to_audio(melody):
+    # (frequência em Hz, duração em segundos) para a síntese de áudio
+    return np.column_stack([melody_frequencies(melody), melody_durations(melody)])
+
+
+def melody_to_arduino(melody):
+    # (frequência escalada, duração em ms) como em generate_arduino_code
+    frequencies = melody_frequencies(melody) * ARDUINO_FREQ_SCALE
+    durations = melody_durations(melody, 1000.0)
+    return np.column_stack([frequencies, durations]).astype(np.int32)
+
+
+def melody_note_names(melody):
+    return _PITCH_LABELS[melody.midi]
+
+
+def parse_rtttl(rtttl):
+    return melody_to_audio(parse_melody(rtttl)).tolist()
 
 
 # Funções para tocar áudio usando scipy e numpy
+@timed("generate_tone")
 def generate_tone(freq, duration, sample_rate=44100):
+    METRICS.count("samples_generated", int(sample_rate * duration))
     if freq == 0:  # Pausa
         return np.zeros(int(sample_rate * duration))
     t = np.linspace(0, duration, int(sample_rate * duration), False)
@@ -64,87 +358,579 @@ def generate_tone(freq, duration, sample_rate=44100):
     return wave
 
 
-def parse_rtttl2(rtttl_string):
-    # Divide a string RTTTL em seções: nome, parâmetros padrão e notas
+# Síntese da melodia inteira. Cada nota vira um intervalo [start, end) de
+# amostras e sua frequência é aproximada por K ciclos em L amostras (erro
+# abaixo de 0,2 cent), então o tom é um laço periódico de L amostras que é
+# calculado uma vez por frequência e depois só copiado para o buffer de
+# saída. A fase é acumulada de nota em nota (em frações de ciclo), logo a
+# onda segue contínua entre as notas; depois de cada pausa ela recomeça do
+# zero, o que evita um estalo na entrada da frase e deixa cada frase
+# independente das anteriores (veja edit_melody).
+SAMPLE_RATE = 44100
+AMPLITUDE = 0.5
+LOOP_MAX = 8192
+
+_LOOP_CYCLES = np.arange(1, 257)
+_LOOP_CACHE = {}
+_LOOP_CACHE_SIZE = 512
+_LOOP_TABLES = {}
+
+SynthPlan = namedtuple("SynthPlan", ["starts", "ends", "cycles", "loop", "phase"])
+
+
+def _loop_table(sample_rate):
+    # Melhor par (K ciclos, L amostras) com L <= LOOP_MAX para cada altura
+    # MIDI, calculado uma vez por taxa de amostragem
+    table = _LOOP_TABLES.get(sample_rate)
+    if table is None:
+        frequencies = 440.0 * 2 ** ((np.arange(_MIDI_RANGE) - 69) / 12)
+        period = sample_rate / frequencies
+        lengths = np.rint(np.outer(period, _LOOP_CYCLES))
+        error = np.abs(lengths / _LOOP_CYCLES - period[:, None])
+        error[(lengths > LOOP_MAX) | (lengths < 1)] = np.inf
+        best = np.argmin(error, axis=1)
+        cycles = _LOOP_CYCLES[best]
+        loop = lengths[np.arange(_MIDI_RANGE), best].astype(np.int64)
+        divisor = np.gcd(cycles, loop)
+        table = _LOOP_TABLES[sample_rate] = (cycles // divisor, loop // divisor)
+    return table
+
+
+def synth_plan(melody, sample_rate=SAMPLE_RATE):
+    samples_per_tick = sample_rate * 240 / melody.bpm / TICKS_PER_WHOLE
+    # cada nota é arredondada sozinha (erro de no máximo meia amostra por
+    # nota), assim o tamanho dela não muda quando uma nota anterior é editada
+    ends = np.cumsum(np.rint(melody.ticks * samples_per_tick).astype(np.int64))
+    starts = np.zeros_like(ends)
+    starts[1:] = ends[:-1]
+
+    cycles, loop = _loop_table(sample_rate)
+    voiced = melody.midi != PAUSE
+    pitch = np.where(voiced, melody.midi, 0)
+    cycles = np.where(voiced, cycles[pitch], 0)
+    loop = np.where(voiced, loop[pitch], 1)
+
+    # fase inicial de cada nota, em frações de ciclo, zerada após pausas;
+    # somada nota a nota dentro da frase para que a mesma frase dê sempre
+    # exatamente a mesma fase, não importa o que vem antes dela
+    advance = ((cycles * (ends - starts)) % loop / loop).tolist()
+    phase = []
+    current = 0.0
+    for note_cycles, note_advance in zip(cycles.tolist(), advance):
+        phase.append(current)
+        current = (current + note_advance) % 1.0 if note_cycles else 0.0
+    return SynthPlan(starts, ends, cycles, loop, np.array(phase))
+
+
+def plan_length(plan):
+    return int(plan.ends[-1]) if len(plan.ends) else 0
+
+
+def _tone_loop(cycles, length, dtype, waveform="sine"):
+    key = (cycles, length, dtype, waveform)
+    loop = _LOOP_CACHE.get(key)
+    if loop is None:
+        if len(_LOOP_CACHE) >= _LOOP_CACHE_SIZE:
+            _LOOP_CACHE.clear()
+        if waveform == "sine":
+            wave = np.sin(2 * np.pi * cycles * np.arange(length) / length)
+        else:
+            wave = _band_limited_loop(waveform, cycles, length)
+        wave *= AMPLITUDE
+        if dtype == np.int16:
+            wave *= 32767
+        loop = _LOOP_CACHE[key] = wave.astype(dtype)
+    return loop
+
+
+def _fill_periodic(target, loop, offset):
+    # target recebe o laço a partir de offset e depois se copia por dobras
+    size = len(target)
+    head = min(size, len(loop) - offset)
+    target[:head] = loop[offset : offset + head]
+    tail = min(size - head, offset)
+    target[head : head + tail] = loop[:tail]
+    filled = min(size, len(loop))
+    while filled < size:
+        chunk = min(filled, size - filled)
+        target[filled : filled + chunk] = target[:chunk]
+        filled += chunk
+
+
+@timed("synth")
+def render_span(plan, start, stop, out):
+    # Escreve as amostras [start, stop) do plano em out (int16 ou float32)
+    METRICS.count("samples_generated", stop - start)
+    note = int(np.searchsorted(plan.ends, start, side="right"))
+    position = start
+    while position < stop:
+        end = min(int(plan.ends[note]), stop)
+        target = out[position - start : end - start]
+        cycles = int(plan.cycles[note])
+        if cycles == 0:
+            target.fill(0)
+        else:
+            length = int(plan.loop[note])
+            # amostra j do laço tem fase cycles * j / length (em ciclos)
+            first = pow(cycles, -1, length) * round(plan.phase[note] * length)
+            offset = (first + position - int(plan.starts[note])) % length
+            _fill_periodic(target, _tone_loop(cycles, length, out.dtype), offset)
+        position = end
+        note += 1
+    return out
+
+
+def render_melody(melody, sample_rate=SAMPLE_RATE, dtype=np.int16):
+    plan = synth_plan(melody, sample_rate)
+    audio = np.empty(plan_length(plan), dtype=dtype)
+    return render_span(plan, 0, len(audio), audio)
+
+
+# Edição ao vivo: o texto novo é comparado token a token com o anterior, só
+# o trecho alterado é interpretado de novo e só as notas cujo plano de
+# síntese mudou (altura, tamanho em amostras ou fase) são renderizadas; o
+# resto do áudio é copiado do buffer anterior. Mudanças no cabeçalho
+# (duração, oitava ou bpm padrão) refazem tudo.
+EditState = namedtuple(
+    "EditState",
+    [
+        "text",
+        "sample_rate",
+        "defaults",
+        "tokens",
+        "notes",
+        "melody",
+        "plan",
+        "audio",
+        "rendered",
+    ],
+)
+
+
+def _full_edit(rtttl_string, name, defaults, tokens, sample_rate):
+    settings = _parse_defaults(defaults)
+    notes = _parse_tokens(tokens, settings["d"], settings["o"])
+    melody = _melody_from_notes(name, settings["b"], [note for note in notes if note])
+    plan = synth_plan(melody, sample_rate)
+    audio = np.empty(plan_length(plan), dtype=np.int16)
+    render_span(plan, 0, len(audio), audio)
+    return EditState(
+        rtttl_string,
+        sample_rate,
+        defaults,
+        tokens,
+        notes,
+        melody,
+        plan,
+        audio,
+        len(audio),
+    )
+
+
+def _splice_columns(old, new_notes, first, old_stop):
+    midi, ticks, dotted = zip(*new_notes) if new_notes else ((), (), ())
+    return (
+        np.concatenate(
+            [old.midi[:first], np.asarray(midi, np.int16), old.midi[old_stop:]]
+        ),
+        np.concatenate(
+            [old.ticks[:first], np.asarray(ticks, np.int16), old.ticks[old_stop:]]
+        ),
+        np.concatenate(
+            [old.dotted[:first], np.asarray(dotted, bool), old.dotted[old_stop:]]
+        ),
+    )
+
+
+def _splice_audio(old_plan, old_audio, plan, first, old_stop, new_stop):
+    # Notas [first, new_stop) do plano novo substituem [first, old_stop) do
+    # antigo; as demais são reaproveitadas se o plano delas não mudou
+    count = len(plan.ends)
+    old_index = np.arange(count)
+    old_index[new_stop:] += old_stop - new_stop
+    reuse = np.ones(count, dtype=bool)
+    reuse[first:new_stop] = False
+    new, old = np.flatnonzero(reuse), old_index[reuse]
+    reuse[new] = (
+        (plan.ends[new] - plan.starts[new] == old_plan.ends[old] - old_plan.starts[old])
+        & (plan.cycles[new] == old_plan.cycles[old])
+        & (plan.loop[new] == old_plan.loop[old])
+        & ((plan.cycles[new] == 0) | (plan.phase[new] == old_plan.phase[old]))
+    )
+
+    # com o mesmo tamanho e as notas reaproveitadas no mesmo lugar, o buffer
+    # antigo é atualizado no lugar
+    total = plan_length(plan)
+    in_place = total == len(old_audio) and np.array_equal(
+        plan.starts[reuse], old_plan.starts[old_index[reuse]]
+    )
+    audio = old_audio if in_place else np.empty(total, dtype=np.int16)
+
+    # trechos contínuos de notas reaproveitadas ou novas; first sempre abre
+    # um trecho, pois ali o mapeamento para o plano antigo dá um salto
+    bounds = np.flatnonzero(np.diff(reuse)) + 1
+    bounds = np.unique(np.concatenate([[0, first, count], bounds]))
+    rendered = 0
+    for run_start, run_stop in zip(bounds[:-1], bounds[1:]):
+        start, stop = int(plan.starts[run_start]), int(plan.ends[run_stop - 1])
+        if not reuse[run_start]:
+            render_span(plan, start, stop, audio[start:stop])
+            rendered += stop - start
+        elif not in_place:
+            old_start = int(old_plan.starts[old_index[run_start]])
+            audio[start:stop] = old_audio[old_start : old_start + stop - start]
+    return audio, rendered
+
+
+@timed("edit")
+def edit_melody(state, rtttl_string, sample_rate=SAMPLE_RATE):
+    # state é o EditState da edição anterior (ou None) e devolve o novo. O
+    # buffer de áudio do anterior pode ser atualizado no lugar, então o state
+    # antigo não deve mais ser usado.
+    rtttl_string = rtttl_string.strip()
+    if state is not None and state.text == rtttl_string:
+        return state._replace(rendered=0)
     sections = rtttl_string.split(":")
     if len(sections) != 3:
         raise ValueError("Formato RTTTL inválido.")
-
     name, defaults, notes = sections
+    tokens = notes.split(",")
+    try:
+        if (
+            state is None
+            or state.defaults != defaults
+            or state.sample_rate != sample_rate
+        ):
+            return _full_edit(rtttl_string, name, defaults, tokens, sample_rate)
+        settings = _parse_defaults(defaults)
+    except ValueError:
+        raise ValueError("Formato RTTTL inválido.") from None
 
-    # Processa os parâmetros padrão
-    default_settings = {}
-    for item in defaults.split(","):
-        key, value = item.split("=")
-        default_settings[key] = int(value) if key != "b" else int(value)
+    # maiores prefixo e sufixo de tokens em comum com a edição anterior
+    old_tokens = state.tokens
+    limit = min(len(old_tokens), len(tokens))
+    prefix = 0
+    while prefix < limit and old_tokens[prefix] == tokens[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old_tokens[-1 - suffix] == tokens[-1 - suffix]:
+        suffix += 1
 
-    # Define os valores padrão
-    default_duration = default_settings.get("d", 4)  # Duração
-    default_octave = default_settings.get("o", 6)  # Oitava
-    bpm = default_settings.get("b", 63)  # Batidas por minuto
+    changed = _parse_tokens(
+        tokens[prefix : len(tokens) - suffix], settings["d"], settings["o"]
+    )
+    kept_tail = state.notes[len(old_tokens) - suffix :]
+    notes = state.notes[:prefix] + changed + kept_tail
 
-    # Converte BPM em milissegundos por batida
-    ms_per_beat = 60000 / bpm
+    # posições equivalentes nas colunas da melodia (tokens inválidos não
+    # viram notas)
+    new_notes = [note for note in changed if note]
+    first = sum(1 for note in state.notes[:prefix] if note)
+    old_stop = len(state.melody.midi) - sum(1 for note in kept_tail if note)
+    new_stop = first + len(new_notes)
+    melody = melody_from_columns(
+        name, settings["b"], *_splice_columns(state.melody, new_notes, first, old_stop)
+    )
+    plan = synth_plan(melody, sample_rate)
+    audio, rendered = _splice_audio(
+        state.plan, state.audio, plan, first, old_stop, new_stop
+    )
+    return EditState(
+        rtttl_string,
+        sample_rate,
+        defaults,
+        tokens,
+        notes,
+        melody,
+        plan,
+        audio,
+        rendered,
+    )
 
-    # Processa as notas
-    note_pattern = re.compile(r"(?:(\d+)?)([a-gpA-GP])(#?)(\d*)")
-    parsed_notes = []
 
-    for match in note_pattern.finditer(notes):
-        duration, note, sharp, octave = match.groups()
-        duration = int(duration) if duration else default_duration
-        octave = int(octave) if octave else default_octave
+# Áudio em streaming: o cabeçalho WAV só depende do número de amostras, que
+# o plano já conhece, então o PCM pode ser gerado em pedaços de tamanho fixo
+# reaproveitando um único buffer, sem nunca materializar a música inteira.
+STREAM_CHUNK = 16384
 
-        if note.lower() == "p":  # Pausa
-            frequency = 0
-        else:
-            note_frequencies = {
-                "c": 16.35,
-                "d": 18.35,
-                "e": 20.60,
-                "f": 21.83,
-                "g": 24.50,
-                "a": 27.50,
-                "b": 30.87,
-            }
-            frequency = note_frequencies[note.lower()] * (2 ** (octave - 4))
-            if sharp:
-                frequency *= 2 ** (1 / 12)  # Ajuste para sustenido
 
-        note_duration = ms_per_beat * (4 / duration)
-        parsed_notes.append(
-            (int(frequency * 9), int(note_duration))
-        )  # Luciano adicionou * 9 para aumentar o volume
+def wav_header(num_samples, sample_rate=SAMPLE_RATE):
+    # PCM 16 bits mono
+    data_size = num_samples * 2
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF",
+        36 + data_size,
+        b"WAVE",
+        b"fmt ",
+        16,
+        1,
+        1,
+        sample_rate,
+        sample_rate * 2,
+        2,
+        16,
+        b"data",
+        data_size,
+    )
+
+
+def _iter_plan_chunks(plan, chunk_size):
+    total = plan_length(plan)
+    buffer = np.empty(chunk_size, dtype="<i2")
+    for start in range(0, total, chunk_size):
+        stop = min(start + chunk_size, total)
+        yield render_span(plan, start, stop, buffer[: stop - start]).tobytes()
+
+
+def iter_pcm_chunks(melody, sample_rate=SAMPLE_RATE, chunk_size=STREAM_CHUNK):
+    yield from _iter_plan_chunks(synth_plan(melody, sample_rate), chunk_size)
+
+
+def iter_wav(melody, sample_rate=SAMPLE_RATE, chunk_size=STREAM_CHUNK):
+    plan = synth_plan(melody, sample_rate)
+    yield wav_header(plan_length(plan), sample_rate)
+    yield from _iter_plan_chunks(plan, chunk_size)
+
+
+@timed("wav_write")
+def write_wav(file, melody, sample_rate=SAMPLE_RATE, chunk_size=STREAM_CHUNK):
+    # file: qualquer objeto com write (arquivo, BytesIO, socket.makefile("wb"))
+    written = 0
+    for chunk in iter_wav(melody, sample_rate, chunk_size):
+        file.write(chunk)
+        written += len(chunk)
+    METRICS.count("wav_bytes_written", written)
+    return written
+
+
+def wav_bytes(melody, sample_rate=SAMPLE_RATE):
+    buffer = io.BytesIO()
+    write_wav(buffer, melody, sample_rate)
+    return buffer.getvalue()
+
+
+# Mixagem polifônica: várias vozes RTTTL, cada uma com sua forma de onda,
+# somadas num único buffer float32. Cada nota reaproveita o plano e os laços
+# periódicos da síntese acima; para quadrada, triângulo e dente de serra o
+# laço de K ciclos em L amostras é montado no domínio da frequência só com
+# os harmônicos abaixo de Nyquist (tabela sem aliasing, calculada uma vez
+# por altura). Cada nota ganha rampas curtas de ataque e de soltura, que
+# tiram o estalo das bordas, e é somada no lugar sobre o buffer de saída a
+# partir de um rascunho reaproveitado, então a memória fica em um buffer
+# do tamanho da música mais um do tamanho da nota mais longa.
+WAVEFORMS = ("sine", "square", "triangle", "saw")
+ATTACK = 0.005
+RELEASE = 0.02
+
+# amplitude do harmônico h (em seno) de cada forma de onda
+_HARMONICS = {
+    "square": lambda h: np.where(h % 2 == 1, 1.0 / h, 0.0),
+    "triangle": lambda h: np.where(h % 2 == 1, (-1.0) ** (h // 2) / h**2, 0.0),
+    "saw": lambda h: (-1.0) ** (h + 1) / h,
+}
+_RAMPS = {}
+
+
+def _band_limited_loop(waveform, cycles, length):
+    # só os harmônicos h com h * cycles < length / 2 cabem abaixo de Nyquist
+    harmonics = np.arange(1, (length - 1) // (2 * cycles) + 1)
+    spectrum = np.zeros(length // 2 + 1, dtype=np.complex128)
+    spectrum[harmonics * cycles] = -0.5j * length * _HARMONICS[waveform](harmonics)
+    if len(harmonics) == 0:
+        return np.zeros(length)  # nem a fundamental cabe: silêncio, não NaN
+    wave = np.fft.irfft(spectrum, n=length)
+    return wave / np.abs(wave).max()
+
+
+def _ramp(size):
+    # rampa de 0 (exclusive) a 1 (inclusive) com size amostras
+    ramp = _RAMPS.get(size)
+    if ramp is None:
+        ramp = _RAMPS[size] = np.arange(1, size + 1, dtype=np.float32) / size
+    return ramp
+
 
-    return name, parsed_notes
+@timed("mix")
+def render_mix(
+    voices, sample_rate=SAMPLE_RATE, dtype=np.int16, attack=ATTACK, release=RELEASE
+):
+    # voices: sequência de (melodia, forma de onda) ou (melodia, forma, ganho)
+    voices = [tuple(voice) + (1.0,) * (3 - len(voice)) for voice in voices]
+    for _, waveform, _ in voices:
+        if waveform not in WAVEFORMS:
+            raise ValueError(f"Forma de onda desconhecida: {waveform}")
+    plans = [synth_plan(melody, sample_rate) for melody, _, _ in voices]
+    # as vozes são somadas direto no buffer de saída: em int16 cada nota é
+    # arredondada antes da soma, sem um buffer float32 da música inteira
+    mix = np.zeros(max(map(plan_length, plans), default=0), dtype=dtype)
+    # ganhos normalizados pela soma: a mistura nunca passa de AMPLITUDE
+    scale = 1.0 / max(1.0, sum(gain for _, _, gain in voices))
+    if dtype == np.int16:
+        scale *= 32767
+    attack = int(round(attack * sample_rate))
+    release = int(round(release * sample_rate))
+
+    for (_, waveform, gain), plan in zip(voices, plans):
+        sizes = plan.ends - plan.starts
+        scratch = np.empty(int(sizes.max(initial=0)), dtype=np.float32)
+        for note in np.flatnonzero(plan.cycles).tolist():
+            start, size = int(plan.starts[note]), int(sizes[note])
+            cycles, length = int(plan.cycles[note]), int(plan.loop[note])
+            target = scratch[:size]
+            offset = pow(cycles, -1, length) * round(plan.phase[note] * length)
+            loop = _tone_loop(cycles, length, np.float32, waveform)
+            _fill_periodic(target, loop, offset % length)
+
+            # notas curtas dividem o tempo entre as duas rampas
+            rise = min(attack, size // 2)
+            fall = min(release, size - rise)
+            if rise:
+                target[:rise] *= _ramp(rise)
+            if fall:
+                target[size - fall :] *= _ramp(fall)[::-1]
+            target *= np.float32(gain * scale)
+            segment = mix[start : start + size]
+            if dtype == np.int16:
+                np.rint(target, out=target)
+            np.add(segment, target, out=segment, casting="unsafe")
+    METRICS.count("samples_generated", len(mix))
+    return mix
+
+
+def parse_rtttl2(rtttl_string):
+    melody = parse_melody(rtttl_string)
+    return melody.name, melody_to_arduino(melody).tolist()
+
+
+def freq_to_midi(freq):
+    # Altura MIDI mais próxima de cada frequência; 0 Hz (pausa) vira PAUSE
+    freq = np.asarray(freq, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        midi = np.rint(69 + 12 * np.log2(freq / 440.0))
+    return np.where(freq > 0, np.clip(midi, 0, _MIDI_RANGE - 1), PAUSE).astype(np.int16)
 
 
 def freq_to_note_name(freq):
-    if freq == 0:
-        return "Pause"
-    note_freq_map = {
-        "C": 261.63,
-        "C#": 277.18,
-        "D": 293.66,
-        "D#": 311.13,
-        "E": 329.63,
-        "F": 349.23,
-        "F#": 369.99,
-        "G": 392.00,
-        "G#": 415.30,
-        "A": 440.00,
-        "A#": 466.16,
-        "B": 493.88,
+    # Aceita uma frequência ou um array delas; devolve o rótulo com oitava
+    # ("A4", "C#5", "Pause") ou um array de rótulos do mesmo formato
+    labels = _PITCH_LABELS[freq_to_midi(freq)]
+    return labels if labels.ndim else str(labels)
+
+
+# Gráfico em piano-roll: cada nota vira um segmento horizontal na sua altura
+# MIDI. Notas iguais em sequência viram um segmento só; acima de
+# PLOT_MAX_SEGMENTS, a linha do tempo é dividida em janelas e cada janela
+# guarda só o segmento mais grave e o mais agudo. Os rótulos ficam no
+# segmento mais longo de cada uma de PLOT_MAX_LABELS janelas, para não se
+# sobreporem. O resultado é um dict no formato JSON de figura do Plotly, de
+# tamanho limitado qualquer que seja a música.
+PLOT_MAX_SEGMENTS = 400
+PLOT_MAX_LABELS = 48
+
+
+def _pick_per_window(window, keys):
+    # índice do primeiro elemento de cada janela, na ordem das chaves
+    order = np.lexsort((keys, window))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = window[order[1:]] != window[order[:-1]]
+    return order[first]
+
+
+def _window_index(start, total, windows):
+    return np.minimum((start * (windows / total)).astype(np.int64), windows - 1)
+
+
+def melody_segments(melody, max_segments=PLOT_MAX_SEGMENTS):
+    # (início em ms, fim em ms, altura MIDI) dos trechos tocados
+    start = melody_onsets(melody, 1000.0)
+    end = start + melody_durations(melody, 1000.0)
+    midi = melody.midi
+    if len(midi) == 0:
+        return start, end, midi
+
+    first = np.ones(len(midi), dtype=bool)
+    first[1:] = midi[1:] != midi[:-1]
+    index = np.flatnonzero(first)
+    last = np.append(index[1:] - 1, len(midi) - 1)
+    start, end, midi = start[index], end[last], midi[index]
+
+    played = midi != PAUSE
+    start, end, midi = start[played], end[played], midi[played]
+    if len(midi) > max_segments:
+        windows = max(1, max_segments // 2)
+        window = _window_index(start, float(end[-1]), windows)
+        lowest = _pick_per_window(window, midi)
+        highest = _pick_per_window(window, -midi)
+        keep = np.union1d(lowest, highest)
+        start, end, midi = start[keep], end[keep], midi[keep]
+    return start, end, midi
+
+
+@timed("plot_spec")
+def melody_plot_spec(
+    melody, max_segments=PLOT_MAX_SEGMENTS, max_labels=PLOT_MAX_LABELS
+):
+    start, end, midi = melody_segments(melody, max_segments)
+    labels = _PITCH_LABELS[midi]
+
+    # segmentos separados por None, que o Plotly desenha como interrupções
+    xs = np.column_stack([start, end, np.full(len(start), np.nan)]).round(1)
+    ys = np.column_stack([midi, midi, np.full(len(midi), np.nan)])
+    x = [None if value != value else value for value in xs.ravel().tolist()]
+    y = [None if value != value else int(value) for value in ys.ravel().tolist()]
+    hover = np.column_stack([labels, labels, labels]).ravel().tolist()
+
+    if len(midi):
+        window = _window_index(start, float(end[-1]), max_labels)
+        shown = np.sort(_pick_per_window(window, start - end))
+    else:
+        shown = np.zeros(0, dtype=np.int64)
+
+    low, high = (int(midi.min()), int(midi.max())) if len(midi) else (60, 72)
+    ticks = list(range(low - low % 12, high + 1, 12))
+    return {
+        "data": [
+            {
+                "type": "scatter",
+                "mode": "lines",
+                "x": x,
+                "y": y,
+                "text": hover,
+                "hoverinfo": "text+x",
+                "line": {"color": "royalblue", "width": 6},
+                "showlegend": False,
+            },
+            {
+                "type": "scatter",
+                "mode": "text",
+                "x": ((start[shown] + end[shown]) / 2).round(1).tolist(),
+                "y": (midi[shown] + 0.8).tolist(),
+                "text": labels[shown].tolist(),
+                "hoverinfo": "skip",
+                "showlegend": False,
+            },
+        ],
+        "layout": {
+            "title": {"text": "Visualização da Melodia com Notas Musicais"},
+            "xaxis": {"title": {"text": "Tempo (ms)"}},
+            "yaxis": {
+                "title": {"text": "Nota"},
+                "tickvals": ticks,
+                "ticktext": _PITCH_LABELS[ticks].tolist(),
+                "range": [low - 1.5, high + 2],
+            },
+            "template": "plotly_white",
+        },
     }
-    note_names = list(note_freq_map.keys())
-    frequencies = list(note_freq_map.values())
-    closest_idx = np.argmin([abs(freq - f) for f in frequencies])
-    return note_names[closest_idx]
 
 
+@timed("arduino_codegen")
 def generate_arduino_code(name, notes):
-    melody_array = ", ".join([str(note[0]) for note in notes])
-    duration_array = ", ".join([str(note[1]) for note in notes])
+    # notes pode ser a lista de parse_rtttl2 ou o array de melody_to_arduino
+    notes = np.asarray(notes, dtype=np.int32).reshape(-1, 2)
+    melody_array = ", ".join(map(str, notes[:, 0].tolist()))
+    duration_array = ", ".join(map(str, notes[:, 1].tolist()))
 
     arduino_code = f"// Melodia: {name}\n"
     arduino_code += "#define TONE_PIN 9\n"
@@ -168,9 +954,296 @@ def generate_arduino_code(name, notes):
     arduino_code += "  melodia();\n"
     arduino_code += "  delay(2000);\n"
     arduino_code += "}\n"
+    METRICS.count("arduino_bytes", len(arduino_code))
     return arduino_code
 
 
+def arduino_identifier(name):
+    identifier = re.sub(r"\W+", "_", name, flags=re.ASCII).strip("_") or "melodia"
+    return "_" + identifier if identifier[0].isdigit() else identifier
+
+
+def generate_arduino_header(name, notes):
+    # Só os arrays, para incluir (#include) em um sketch existente
+    notes = np.asarray(notes, dtype=np.int32).reshape(-1, 2)
+    identifier = arduino_identifier(name)
+    melody_array = ", ".join(map(str, notes[:, 0].tolist()))
+    duration_array = ", ".join(map(str, notes[:, 1].tolist()))
+
+    header = f"// Melodia: {name}\n"
+    header += "#pragma once\n\n"
+    header += f"const int {identifier}_length = {len(notes)};\n"
+    header += f"const int {identifier}_melody[] = {{ " + melody_array + " };\n"
+    header += f"const int {identifier}_durations[] = {{ " + duration_array + " };\n"
+    return header
+
+
+# Geração compacta para AVR: as frequências e durações distintas da música
+# vão para tabelas uint16 em PROGMEM (flash) e cada nota vira dois bytes,
+# índice da frequência e índice da duração, também em flash. Com rle=True,
+# notas repetidas em sequência viram um trio (repetições, frequência,
+# duração). Nenhum array da melodia ocupa SRAM.
+ARDUINO_ENCODINGS = ("sram", "progmem", "progmem_rle")
+
+
+def _pack_arduino_notes(notes, rle=False):
+    notes = np.asarray(notes, dtype=np.int32).reshape(-1, 2)
+    frequencies, frequency_index = np.unique(notes[:, 0], return_inverse=True)
+    durations, duration_index = np.unique(notes[:, 1], return_inverse=True)
+    if len(frequencies) > 256 or len(durations) > 256:
+        raise ValueError("Melodia com mais de 256 frequências ou durações.")
+    packed = np.column_stack([frequency_index, duration_index]).astype(np.uint8)
+    if rle:
+        # início de cada sequência de notas iguais; sequências acima de 255
+        # notas são quebradas
+        new_run = np.ones(len(packed), dtype=bool)
+        new_run[1:] = np.any(packed[1:] != packed[:-1], axis=1)
+        starts = np.flatnonzero(new_run)
+        counts = np.diff(np.append(starts, len(packed)))
+        runs = []
+        for start, count in zip(starts.tolist(), counts.tolist()):
+            for chunk in range(0, count, 255):
+                runs.append([min(255, count - chunk)] + packed[start].tolist())
+        packed = np.array(runs, dtype=np.uint8).reshape(-1, 3)
+    return frequencies, durations, packed
+
+
+def arduino_memory_usage(notes, encoding="sram"):
+    # Bytes ocupados pelos dados da melodia (o código do laço não entra)
+    notes = np.asarray(notes, dtype=np.int32).reshape(-1, 2)
+    if encoding == "sram":
+        # dois int[] inicializados: ficam na flash e são copiados para a SRAM
+        size = 4 * len(notes)
+        return {"encoding": encoding, "flash_bytes": size, "ram_bytes": size}
+    frequencies, durations, packed = _pack_arduino_notes(
+        notes, rle=encoding == "progmem_rle"
+    )
+    flash = 2 * len(frequencies) + 2 * len(durations) + packed.size
+    return {"encoding": encoding, "flash_bytes": flash, "ram_bytes": 0}
+
+
+@timed("arduino_codegen")
+def generate_arduino_code_packed(name, notes, rle=False):
+    frequencies, durations, packed = _pack_arduino_notes(notes, rle)
+    frequency_array = ", ".join(map(str, frequencies.tolist()))
+    duration_array = ", ".join(map(str, durations.tolist()))
+    note_array = ", ".join(map(str, packed.ravel().tolist()))
+    step = 3 if rle else 2
+
+    arduino_code = f"// Melodia: {name}\n"
+    arduino_code += "#include <avr/pgmspace.h>\n"
+    arduino_code += "#define TONE_PIN 9\n"
+    arduino_code += f"const uint16_t frequencies[] PROGMEM = {{ {frequency_array} }};\n"
+    arduino_code += f"const uint16_t durations[] PROGMEM = {{ {duration_array} }};\n"
+    if rle:
+        arduino_code += "// repetições, índice da frequência, índice da duração\n"
+    else:
+        arduino_code += "// índice da frequência, índice da duração\n"
+    arduino_code += f"const uint8_t notes[] PROGMEM = {{ {note_array} }};\n\n"
+
+    arduino_code += "void melodia() {\n"
+    arduino_code += f"  for (uint16_t i = 0; i < sizeof(notes); i += {step}) {{\n"
+    if rle:
+        arduino_code += "    uint8_t count = pgm_read_byte(&notes[i]);\n"
+    arduino_code += f"    uint8_t f = pgm_read_byte(&notes[i + {step - 2}]);\n"
+    arduino_code += f"    uint8_t d = pgm_read_byte(&notes[i + {step - 1}]);\n"
+    arduino_code += "    uint16_t frequency = pgm_read_word(&frequencies[f]);\n"
+    arduino_code += "    uint16_t noteDuration = pgm_read_word(&durations[d]);\n"
+    if rle:
+        arduino_code += "    for (uint8_t n = 0; n < count; n++) {\n"
+        indent = "      "
+    else:
+        indent = "    "
+    arduino_code += f"{indent}if (frequency) tone(TONE_PIN, frequency, noteDuration);\n"
+    arduino_code += f"{indent}delay(noteDuration);\n"
+    arduino_code += f"{indent}noTone(TONE_PIN);\n"
+    if rle:
+        arduino_code += "    }\n"
+    arduino_code += "  }\n"
+    arduino_code += "}\n\n"
+
+    arduino_code += "void setup() {\n"
+    arduino_code += "  pinMode(TONE_PIN, OUTPUT);\n"
+    arduino_code += "}\n\n"
+
+    arduino_code += "void loop() {\n"
+    arduino_code += "  melodia();\n"
+    arduino_code += "  delay(2000);\n"
+    arduino_code += "}\n"
+    METRICS.count("arduino_bytes", len(arduino_code))
+    return arduino_code
+
+
+def generate_arduino_code_for(name, notes, encoding="sram"):
+    # encoding: um de ARDUINO_ENCODINGS, ou "auto" para o de menor uso
+    # (SRAM primeiro, depois flash). Melodias que não cabem nos bytes do
+    # PROGMEM saem em "sram", com o motivo em usage["fallback"]
+    if encoding not in ARDUINO_ENCODINGS + ("auto",):
+        raise ValueError(f"Codificação desconhecida: {encoding}")
+    if encoding == "auto":
+        encoding = min(
+            ARDUINO_ENCODINGS,
+            key=lambda option: _encoding_cost(notes, option),
+        )
+    if encoding != "sram":
+        try:
+            code = generate_arduino_code_packed(name, notes, encoding == "progmem_rle")
+            return code, arduino_memory_usage(notes, encoding)
+        except ValueError as e:
+            usage = arduino_memory_usage(notes)
+            usage["fallback"] = str(e)
+            return generate_arduino_code(name, notes), usage
+    return generate_arduino_code(name, notes), arduino_memory_usage(notes)
+
+
+def _encoding_cost(notes, encoding):
+    try:
+        usage = arduino_memory_usage(notes, encoding)
+    except ValueError:
+        return (float("inf"), float("inf"))
+    return (usage["ram_bytes"], usage["flash_bytes"])
+
+
+# Cache de resultados entre reruns do Streamlit: a chave é o hash do texto
+# RTTTL (mais o tipo do resultado e seus parâmetros), o tamanho total é
+# limitado em bytes e as entradas menos usadas recentemente saem primeiro.
+RESULT_CACHE_BYTES = 64 * 2**20
+# O EditState guarda o PCM inteiro da música fora desse limite, uma cópia por
+# sessão; acima deste tamanho (~95 s a 44.1 kHz) ele não é mantido entre reruns
+EDIT_STATE_MAX_BYTES = 8 * 2**20
+
+
+class LRUCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size):
+        with self._lock:
+            if size > self.max_bytes:
+                return value  # não cabe: devolve sem guardar
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self._entries[key] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+RESULT_CACHE = LRUCache(RESULT_CACHE_BYTES)
+
+
+def content_key(rtttl_string, *params):
+    digest = hashlib.blake2b(rtttl_string.strip().encode(), digest_size=16).digest()
+    return (digest,) + params
+
+
+def cached_melody(rtttl_string, melody=None):
+    # melody: a mesma música já interpretada (ex.: vinda do SongStore), usada
+    # em vez de interpretar o texto de novo quando não está no cache
+    key = content_key(rtttl_string, "melody")
+    cached = RESULT_CACHE.get(key)
+    if cached is None:
+        melody = parse_melody(rtttl_string) if melody is None else melody
+        for column in melody[2:]:
+            column.flags.writeable = False  # compartilhado entre sessões
+        size = sum(column.nbytes for column in melody[2:]) + 256
+        RESULT_CACHE.put(key, melody, size)
+        cached = melody
+    return cached
+
+
+def cached_arduino_code(rtttl_string, encoding="sram"):
+    # devolve (código, uso de memória); veja generate_arduino_code_for
+    key = content_key(rtttl_string, "arduino", encoding)
+    result = RESULT_CACHE.get(key)
+    if result is None:
+        melody = cached_melody(rtttl_string)
+        result = generate_arduino_code_for(
+            melody.name, melody_to_arduino(melody), encoding
+        )
+        RESULT_CACHE.put(key, result, len(result[0]) + 256)
+    return result
+
+
+def cached_plot_spec(rtttl_string):
+    key = content_key(rtttl_string, "plot", PLOT_MAX_SEGMENTS, PLOT_MAX_LABELS)
+    spec = RESULT_CACHE.get(key)
+    if spec is None:
+        spec = melody_plot_spec(cached_melody(rtttl_string))
+        # estimativa do tamanho: ~40 bytes por ponto e por rótulo
+        size = 40 * (len(spec["data"][0]["x"]) + len(spec["data"][1]["x"]))
+        RESULT_CACHE.put(key, spec, size + 1024)
+    return spec
+
+
+def cached_wav_bytes(rtttl_string, sample_rate=SAMPLE_RATE, samples=None):
+    # samples: PCM já renderizado (ex.: EditState.audio), ou uma função que o
+    # devolve, usado em vez de sintetizar de novo quando o WAV não está no
+    # cache; a função só é chamada nesse caso
+    key = content_key(rtttl_string, "wav", sample_rate)
+    audio = RESULT_CACHE.get(key)
+    if audio is None:
+        if callable(samples):
+            samples = samples()
+        if samples is None:
+            audio = wav_bytes(cached_melody(rtttl_string), sample_rate)
+        else:
+            header = wav_header(len(samples), sample_rate)
+            audio = header + samples.astype("<i2", copy=False).tobytes()
+            METRICS.count("wav_bytes_written", len(audio))
+        RESULT_CACHE.put(key, audio, len(audio))
+    return audio
+
+
+def cached_mix_wav_bytes(rtttl_strings, waveform="sine", sample_rate=SAMPLE_RATE):
+    # WAV da mistura de várias vozes (uma string RTTTL por voz), veja render_mix
+    key = content_key("\n".join(rtttl_strings), "mix", waveform, sample_rate)
+    audio = RESULT_CACHE.get(key)
+    if audio is None:
+        voices = [(cached_melody(text), waveform) for text in rtttl_strings]
+        samples = render_mix(voices, sample_rate).astype("<i2", copy=False)
+        # join copia o PCM uma vez só, direto do buffer do array
+        audio = b"".join([wav_header(len(samples), sample_rate), samples.data])
+        RESULT_CACHE.put(key, audio, len(audio))
+    return audio
+
+
 # crie uma função para ler um arquivo com varias musicas rtttl e
 # formato do input:
 # #1:d=4,o=6,b=180:16p,32g_5,8a5,32p,8a5,8a5,32d_,8e.5,16p,c5,a5,16a,16a5,32g_5,8a5,32p,8g5,a5,32a5,32a5,8p,8a5,32g_5,8a5,32p,16a.5,32p,32g_5,8a5,32p,8g5,8a5,8e5,16e.5,32p,16a.5,32p,32g_5,8a5,32p,8a5,8a5,8g5,8a5,8e5,32e5,32e5,8p,8e5,32g_5
@@ -194,11 +1267,23 @@ def generate_arduino_code(name, notes):
 # NOME;RTTTL
 # 03Bonnie;03Bonnie:d=4,o=5,b=180:32c6,16p,32c6,16p,8c.6,16p,32c6,16p,32c6,16p,16c.6,32p,8b,8p,8b,8p,8b.,16p,32d6,16p,16e,16p,16e.,8p,32p,16e.,32p,8b.,16p,8a,p,32a6,16p,16a6,16p,16a6,16p,16a6,16p,16a6,16p,16a6,16p,16d6,16p,16c6,16p,16a,16p,8f6,8p,8f.6,16p,1e6,8p,32b,32p,32g,32p,1e,32p,16d.6,32p,16d.6,32p,8c6,1b,32p,16a.,32p,16c.6,32p,16d6
 # ...
-def read_and_save_rtttl(file_path):
+def read_and_save_rtttl(file_path, dedupe=False, threshold=None):
+    # dedupe: só a primeira de cada grupo de músicas iguais a menos de tom e
+    # andamento (ou parecidas acima de threshold, veja similarity.py)
     from tqdm import tqdm
 
     with open(file_path, "r") as file:
         rtttl_songs = file.readlines()
+    if dedupe:
+        from similarity import build_index
+
+        canonical = build_index(file_path).canonical(threshold)
+        rtttl_songs = [song for song in rtttl_songs if song.strip()]
+        rtttl_songs = [
+            song
+            for song_id, song in enumerate(rtttl_songs)
+            if canonical[song_id] == song_id
+        ]
 
     with open("rtttl_songs.psv", "w") as file:
         file.write("NOME|RTTTL\n")
@@ -0,0 +1,423 @@
+# Serviço HTTP de conversão RTTTL, só com a biblioteca padrão (asyncio).
+#
+#   POST /arduino[?encoding=auto]  corpo: RTTTL  ->  sketch Arduino (.ino)
+#   POST /notes                    corpo: RTTTL  ->  JSON de parse_rtttl2
+#   POST /wav[?sample_rate=44100]  corpo: RTTTL  ->  WAV em streaming
+#   GET  /stats                    contadores do serviço e do cache
+#
+# As conversões curtas (/arduino, /notes) entram numa fila e são agrupadas em
+# micro-lotes: o primeiro pedido espera até --batch-window-ms pelos
+# seguintes e o lote inteiro vai num único envio para o pool de processos,
+# diluindo o custo de IPC. O WAV é sintetizado pedaço a pedaço num pool de
+# threads (a cópia dos laços em NumPy libera o GIL) e cada pedaço só é
+# gerado depois que o anterior foi escoado para o cliente. Fila cheia ou
+# streams demais respondem 503 com Retry-After em vez de acumular memória;
+# o mesmo vale para conexões demais, e conexões ociosas por mais de
+# --idle-timeout segundos são fechadas.
+#
+# Uso: python service.py [--port 8000] [--workers N] [--batch-size 64]
+#          [--max-connections 256] [--idle-timeout 30]
+# Teste de carga: python benchmarks/bench_service.py
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import struct
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+from rtttl import (
+    ARDUINO_ENCODINGS,
+    RESULT_CACHE,
+    SAMPLE_RATE,
+    cached_arduino_code,
+    cached_melody,
+    iter_wav,
+    parse_rtttl2,
+)
+
+MAX_BODY = 64 * 1024
+MAX_HEADERS = 64
+WAV_CHUNK = 65536
+
+
+class HTTPError(Exception):
+    # close: o pedido não pôde ser lido até o fim, então a conexão não
+    # pode ser reaproveitada
+    def __init__(self, status, message=None, close=False):
+        super().__init__(message or HTTPStatus(status).phrase)
+        self.status = status
+        self.close = close
+
+
+def convert(kind, rtttl_string, params):
+    # Executado nos processos do pool: (status, content-type, corpo, headers)
+    try:
+        if kind == "arduino":
+            code, usage = cached_arduino_code(rtttl_string, params["encoding"])
+            headers = {
+                "X-Encoding": usage["encoding"],
+                "X-Flash-Bytes": usage["flash_bytes"],
+                "X-Ram-Bytes": usage["ram_bytes"],
+            }
+            if "fallback" in usage:
+                headers["X-Encoding-Fallback"] = usage["fallback"]
+            return 200, "text/x-c; charset=utf-8", code.encode(), headers
+        name, notes = parse_rtttl2(rtttl_string)
+        body = json.dumps({"name": name, "notes": notes}, ensure_ascii=False)
+        return 200, "application/json", body.encode(), {}
+    except ValueError as e:
+        return 400, "text/plain; charset=utf-8", str(e).encode(), {}
+    except Exception as e:
+        message = f"{type(e).__name__}: {e}"
+        return 500, "text/plain; charset=utf-8", message.encode(), {}
+
+
+def convert_batch(jobs):
+    return [convert(*job) for job in jobs]
+
+
+def _warm_up():
+    return os.getpid()
+
+
+class Batcher:
+    def __init__(self, executor, workers, batch_size, window, max_pending):
+        self.executor = executor
+        self.batch_size = batch_size
+        self.window = window
+        self.queue = asyncio.Queue(max_pending)
+        # um lote por processo; enquanto todos estão ocupados a fila cresce
+        # e o próximo lote sai maior
+        self.slots = asyncio.Semaphore(workers)
+        self.batches = 0
+        self.jobs = 0
+        self.tasks = set()
+
+    async def submit(self, job):
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((job, future))
+        except asyncio.QueueFull:
+            raise HTTPError(503, "Fila de conversões cheia.") from None
+        return await future
+
+    async def run(self):
+        while True:
+            batch = [await self.queue.get()]
+            await self.slots.acquire()
+            if self.queue.qsize() < self.batch_size - 1:
+                await asyncio.sleep(self.window)
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            task = asyncio.create_task(self._dispatch(batch))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def _dispatch(self, batch):
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(
+                self.executor, convert_batch, [job for job, _ in batch]
+            )
+        except Exception as e:
+            error = (500, "text/plain; charset=utf-8", str(e).encode(), {})
+            results = [error] * len(batch)
+        finally:
+            self.slots.release()
+        self.batches += 1
+        self.jobs += len(batch)
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+async def read_line(reader, status):
+    # linha maior que o limite do StreamReader (64 KiB) vira erro HTTP
+    try:
+        return await reader.readline()
+    except (ValueError, asyncio.LimitOverrunError):
+        raise HTTPError(status, close=True) from None
+
+
+async def read_request(reader):
+    # (método, caminho, query, headers, corpo), ou None se o cliente fechou
+    line = await read_line(reader, 414)
+    if not line:
+        return None
+    try:
+        method, target, _ = line.decode("latin-1").split()
+    except ValueError:
+        raise HTTPError(400, close=True) from None
+    headers = {}
+    while True:
+        line = await read_line(reader, 431)
+        if line in (b"\r\n", b"\n", b""):
+            break
+        if len(headers) >= MAX_HEADERS:
+            raise HTTPError(431, close=True)
+        key, _, value = line.decode("latin-1").partition(":")
+        headers[key.strip().lower()] = value.strip()
+    if "transfer-encoding" in headers:
+        # corpo em chunks não é lido; tratá-lo como vazio dessincronizaria
+        # a conexão, pois os chunks seriam lidos como o próximo pedido
+        raise HTTPError(411, "Envie o corpo com Content-Length.", close=True)
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise HTTPError(400, close=True) from None
+    if length < 0 or length > MAX_BODY:
+        raise HTTPError(413, close=True)
+    body = await reader.readexactly(length) if length else b""
+    url = urlsplit(target)
+    query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+    return method.upper(), url.path, query, headers, body
+
+
+def response_head(status, content_type, length, headers=None, keep_alive=True):
+    lines = [
+        f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+        f"Content-Type: {content_type}",
+        f"Content-Length: {length}",
+        "Connection: " + ("keep-alive" if keep_alive else "close"),
+    ]
+    lines += [f"{key}: {value}" for key, value in (headers or {}).items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+class ConversionService:
+    def __init__(
+        self,
+        workers=None,
+        batch_size=64,
+        batch_window=0.002,
+        max_pending=1024,
+        max_streams=16,
+        max_connections=256,
+        idle_timeout=30.0,
+    ):
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.max_pending = max_pending
+        self.max_streams = max_streams
+        # conexões abertas também são limitadas, e cada pedido tem
+        # idle_timeout segundos para chegar inteiro
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.connections = 0
+        self.streams = 0
+        self.requests = 0
+        self.rejected = 0
+
+    async def start(self, host, port):
+        # Os processos do pool saem de um forkserver e são todos criados
+        # antes de abrir a porta: um fork depois de start_server herdaria o
+        # socket de escuta e os dos clientes, e uma conexão com
+        # "Connection: close" nunca veria EOF
+        self.processes = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("forkserver"),
+        )
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *[
+                loop.run_in_executor(self.processes, _warm_up)
+                for _ in range(self.workers)
+            ]
+        )
+        self.threads = ThreadPoolExecutor(max_workers=self.max_streams)
+        self.batcher = Batcher(
+            self.processes,
+            self.workers,
+            self.batch_size,
+            self.batch_window,
+            self.max_pending,
+        )
+        self.batcher_task = asyncio.create_task(self.batcher.run())
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.batcher_task.cancel()
+        self.processes.shutdown(cancel_futures=True)
+        self.threads.shutdown(cancel_futures=True)
+
+    async def handle(self, reader, writer):
+        if self.connections >= self.max_connections:
+            self.rejected += 1
+            self.send(writer, 503, "Conexões demais.", {"Retry-After": 1}, False)
+            writer.close()
+            return
+        self.connections += 1
+        keep_alive = True
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(
+                        read_request(reader), self.idle_timeout
+                    )
+                    if request is None:
+                        break
+                    method, path, query, headers, body = request
+                    keep_alive = headers.get("connection", "").lower() != "close"
+                    self.requests += 1
+                    await self.dispatch(writer, method, path, query, body, keep_alive)
+                except HTTPError as e:
+                    if e.status == 503:
+                        self.rejected += 1
+                    keep_alive = keep_alive and not e.close
+                    extra = {"Retry-After": 1} if e.status == 503 else None
+                    self.send(writer, e.status, str(e), extra, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    def send(self, writer, status, body, headers=None, keep_alive=True):
+        if isinstance(body, str):
+            body = body.encode()
+            content_type = "text/plain; charset=utf-8"
+        else:
+            content_type, body = body
+        writer.write(
+            response_head(status, content_type, len(body), headers, keep_alive) + body
+        )
+
+    async def dispatch(self, writer, method, path, query, body, keep_alive):
+        if path == "/stats" and method == "GET":
+            payload = json.dumps(self.stats()).encode()
+            self.send(writer, 200, ("application/json", payload), None, keep_alive)
+            return
+        if path not in ("/arduino", "/notes", "/wav"):
+            raise HTTPError(404)
+        if method != "POST":
+            raise HTTPError(405)
+        try:
+            rtttl_string = body.decode("utf-8").strip()
+        except UnicodeDecodeError:
+            raise HTTPError(400, "Corpo não está em UTF-8.") from None
+        if not rtttl_string:
+            raise HTTPError(400, "Corpo vazio: envie o código RTTTL.")
+
+        if path == "/wav":
+            await self.stream_wav(writer, rtttl_string, query, keep_alive)
+            return
+        params = {}
+        if path == "/arduino":
+            params["encoding"] = query.get("encoding", "sram")
+            if params["encoding"] not in ARDUINO_ENCODINGS + ("auto",):
+                raise HTTPError(400, "encoding inválido.")
+        job = (path[1:], rtttl_string, params)
+        status, content_type, payload, headers = await self.batcher.submit(job)
+        self.send(writer, status, (content_type, payload), headers, keep_alive)
+
+    async def stream_wav(self, writer, rtttl_string, query, keep_alive):
+        try:
+            sample_rate = int(query.get("sample_rate", SAMPLE_RATE))
+        except ValueError:
+            raise HTTPError(400, "sample_rate inválido.") from None
+        if not 8000 <= sample_rate <= 96000:
+            raise HTTPError(400, "sample_rate fora de 8000..96000.")
+        if self.streams >= self.max_streams:
+            raise HTTPError(503, "Streams de áudio demais em andamento.")
+
+        loop = asyncio.get_running_loop()
+        self.streams += 1
+        try:
+            # erros até o cabeçalho ainda viram resposta HTTP, como em convert
+            try:
+                melody = await loop.run_in_executor(
+                    self.threads, cached_melody, rtttl_string
+                )
+                chunks = iter_wav(melody, sample_rate, WAV_CHUNK)
+                header = await loop.run_in_executor(self.threads, next, chunks)
+            except ValueError as e:
+                raise HTTPError(400, str(e)) from None
+            except Exception as e:
+                raise HTTPError(500, f"{type(e).__name__}: {e}") from None
+            data_size = struct.unpack_from("<I", header, 40)[0]
+            writer.write(
+                response_head(
+                    200, "audio/wav", len(header) + data_size, None, keep_alive
+                )
+                + header
+            )
+            while True:
+                await writer.drain()
+                chunk = await loop.run_in_executor(self.threads, next, chunks, None)
+                if chunk is None:
+                    break
+                writer.write(chunk)
+        finally:
+            self.streams -= 1
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "rejected": self.rejected,
+            "pending": self.batcher.queue.qsize(),
+            "batches": self.batcher.batches,
+            "batched_jobs": self.batcher.jobs,
+            "mean_batch": round(self.batcher.jobs / max(1, self.batcher.batches), 2),
+            "connections": self.connections,
+            "streams": self.streams,
+            "workers": self.workers,
+            # só o cache do processo do servidor (melodias do /wav)
+            "cache": RESULT_CACHE.stats(),
+        }
+
+
+async def serve(args):
+    service = ConversionService(
+        args.workers,
+        args.batch_size,
+        args.batch_window_ms / 1000,
+        args.max_pending,
+        args.max_streams,
+        args.max_connections,
+        args.idle_timeout,
+    )
+    server = await service.start(args.host, args.port)
+    # SIGTERM encerra como o Ctrl+C, desligando o pool; sem isso o forkserver
+    # e os processos ficariam órfãos
+    asyncio.get_running_loop().add_signal_handler(
+        signal.SIGTERM, asyncio.current_task().cancel
+    )
+    print(f"ouvindo em http://{args.host}:{args.port} ({service.workers} processos)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serviço HTTP de conversão RTTTL")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--batch-window-ms", type=float, default=2.0)
+    parser.add_argument("--max-pending", type=int, default=1024)
+    parser.add_argument("--max-streams", type=int, default=16)
+    parser.add_argument("--max-connections", type=int, default=256)
+    parser.add_argument("--idle-timeout", type=float, default=30.0)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+
+
+if __name__ == "__main__":
+    main()
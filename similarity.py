@@ -0,0 +1,207 @@
+# Índice de similaridade do acervo: cada melodia é normalizada para tom e
+# andamento como uma sequência de pares (intervalo em semitons, razão entre
+# durações consecutivas), de modo que a mesma música transposta de oitava
+# ou escrita com outro d=/b= produz a mesma sequência. A sequência inteira
+# vira uma chave exata; os 4-gramas alimentam uma assinatura MinHash, e as
+# assinaturas são agrupadas em faixas (LSH) para achar candidatos parecidos
+# sem comparar todas as músicas entre si.
+#
+# Uso: python similarity.py [rtttl_songs.txt] [--similar NOME] [--threshold 0.8]
+import argparse
+import hashlib
+
+import numpy as np
+
+from rtttl import PAUSE
+from song_store import open_store
+
+NGRAM = 4
+NUM_HASHES = 64
+BANDS = 16  # 16 faixas de 4 linhas: pares com Jaccard acima de ~0.5 colidem
+_PRIME = (1 << 31) - 1
+_RNG = np.random.default_rng(0x5EED)
+_HASH_A = _RNG.integers(1, _PRIME, NUM_HASHES, dtype=np.uint64)
+_HASH_B = _RNG.integers(0, _PRIME, NUM_HASHES, dtype=np.uint64)
+
+# intervalos além de duas oitavas e razões além de 2 ** 4 são saturados
+_MAX_INTERVAL = 24
+_MAX_RATIO = 8
+_RATIO_CODES = 2 * _MAX_RATIO + 1
+_TOKENS = (2 * _MAX_INTERVAL + 1) * _RATIO_CODES
+
+
+def melody_tokens(melody):
+    # Um token por par de notas tocadas consecutivas; pausas se somam à
+    # duração da nota anterior (intervalo entre ataques)
+    sounded = np.flatnonzero(melody.midi != PAUSE)
+    if len(sounded) < 2:
+        return np.zeros(0, dtype=np.int64)
+    onset = melody.onset[sounded].astype(np.int64)
+    end = int(melody.onset[-1]) + int(melody.ticks[-1])
+    ioi = np.diff(np.append(onset, end))
+    ioi = np.maximum(ioi, 1)
+
+    interval = np.diff(melody.midi[sounded].astype(np.int64))
+    interval = np.clip(interval, -_MAX_INTERVAL, _MAX_INTERVAL) + _MAX_INTERVAL
+    # meio tom de log2: distingue pontuadas (1.5x) de dobradas (2x)
+    ratio = np.rint(2 * np.log2(ioi[1:] / ioi[:-1])).astype(np.int64)
+    ratio = np.clip(ratio, -_MAX_RATIO, _MAX_RATIO) + _MAX_RATIO
+    return interval * _RATIO_CODES + ratio
+
+
+def exact_key(tokens):
+    return hashlib.blake2b(tokens.astype("<i2").tobytes(), digest_size=8).hexdigest()
+
+
+def _shingles(tokens):
+    # n-gramas codificados sem colisão em base _TOKENS (833 ** 4 < 2 ** 40),
+    # espalhados para 31 bits; sequências curtas viram um único n-grama
+    size = min(NGRAM, len(tokens))
+    count = len(tokens) - size + 1
+    code = np.zeros(count, dtype=np.uint64)
+    for offset in range(size):
+        window = tokens[offset : offset + count].astype(np.uint64)
+        code = code * np.uint64(_TOKENS) + window
+    code = code * np.uint64(0x9E3779B97F4A7C15)  # multiplicação com overflow
+    return code >> np.uint64(33)
+
+
+def minhash(shingles):
+    hashes = (_HASH_A * shingles[:, None] + _HASH_B) % np.uint64(_PRIME)
+    return hashes.min(axis=0).astype(np.uint32)
+
+
+class SimilarityIndex:
+    def __init__(self, names, keys, signatures):
+        # keys[i] é None para músicas inválidas ou com menos de duas notas,
+        # que ficam fora das consultas
+        self.names = names
+        self.keys = keys
+        self.signatures = signatures
+        self.valid = np.array([key is not None for key in keys], dtype=bool)
+        self._by_key = {}
+        for song_id, key in enumerate(keys):
+            if key is not None:
+                self._by_key.setdefault(key, []).append(song_id)
+        self._buckets = [{} for _ in range(BANDS)]
+        rows = NUM_HASHES // BANDS
+        for band, buckets in enumerate(self._buckets):
+            chunk = np.ascontiguousarray(signatures[:, band * rows : (band + 1) * rows])
+            for song_id in np.flatnonzero(self.valid).tolist():
+                buckets.setdefault(chunk[song_id].tobytes(), []).append(song_id)
+
+    def __len__(self):
+        return len(self.names)
+
+    def exact_duplicates(self):
+        # grupos de ids com a mesma sequência normalizada
+        return [ids for ids in self._by_key.values() if len(ids) > 1]
+
+    def candidates(self, signature):
+        rows = NUM_HASHES // BANDS
+        found = set()
+        for band, buckets in enumerate(self._buckets):
+            chunk = signature[band * rows : (band + 1) * rows].tobytes()
+            found.update(buckets.get(chunk, ()))
+        return np.array(sorted(found), dtype=np.int64)
+
+    def _rank(self, ids, signature, limit, threshold):
+        if len(ids) == 0:
+            return []
+        scores = (self.signatures[ids] == signature).mean(axis=1)
+        order = np.argsort(-scores, kind="stable")[:limit]
+        return [
+            (int(ids[i]), float(scores[i])) for i in order if scores[i] >= threshold
+        ]
+
+    def similar(self, melody, limit=10, threshold=0.3, exhaustive=False):
+        # [(id, similaridade estimada)] em ordem decrescente; exhaustive
+        # compara com o acervo inteiro em vez de só os candidatos do LSH
+        tokens = melody_tokens(melody)
+        if len(tokens) == 0:
+            return []
+        signature = minhash(_shingles(tokens))
+        if exhaustive:
+            ids = np.flatnonzero(self.valid)
+        else:
+            ids = self.candidates(signature)
+        return self._rank(ids, signature, limit, threshold)
+
+    def similar_to(self, song_id, limit=10, threshold=0.3):
+        # como similar, para uma música do próprio índice (sem ela mesma)
+        if not self.valid[song_id]:
+            return []
+        signature = self.signatures[song_id]
+        ids = self.candidates(signature)
+        return self._rank(ids[ids != song_id], signature, limit, threshold)
+
+    def canonical(self, threshold=None):
+        # Para cada música, o id da primeira do seu grupo de duplicatas.
+        # Sem threshold só contam sequências idênticas; com ele, também as
+        # quase idênticas (similaridade estimada >= threshold)
+        parent = np.arange(len(self.names))
+
+        def root(song_id):
+            while parent[song_id] != song_id:
+                parent[song_id] = parent[parent[song_id]]
+                song_id = parent[song_id]
+            return song_id
+
+        def union(first, second):
+            first, second = root(first), root(second)
+            if first != second:
+                parent[max(first, second)] = min(first, second)
+
+        for ids in self.exact_duplicates():
+            for song_id in ids[1:]:
+                union(ids[0], song_id)
+        if threshold is not None:
+            for song_id in np.flatnonzero(self.valid).tolist():
+                for other, _ in self.similar_to(song_id, len(self.names), threshold):
+                    union(song_id, other)
+        return np.array([root(song_id) for song_id in range(len(parent))])
+
+
+def build_index(source_path):
+    # Usa as melodias já interpretadas do SongStore do arquivo
+    store = open_store(source_path)
+    keys, signatures = [], np.full((len(store), NUM_HASHES), _PRIME, dtype=np.uint32)
+    for song_id in range(len(store)):
+        try:
+            tokens = melody_tokens(store.melody(song_id))
+        except ValueError:
+            tokens = ()
+        if len(tokens) == 0:
+            keys.append(None)
+            continue
+        keys.append(exact_key(tokens))
+        signatures[song_id] = minhash(_shingles(tokens))
+    names = list(store.names)
+    store.close()
+    return SimilarityIndex(names, keys, signatures)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Duplicatas e músicas parecidas")
+    parser.add_argument("file_path", nargs="?", default="rtttl_songs.txt")
+    parser.add_argument("--similar", help="lista as músicas parecidas com esta")
+    parser.add_argument("--threshold", type=float, default=0.8)
+    args = parser.parse_args()
+
+    index = build_index(args.file_path)
+    if args.similar:
+        for song_id in [i for i, n in enumerate(index.names) if n == args.similar]:
+            for other, score in index.similar_to(song_id, threshold=0.3):
+                print(f"{index.names[song_id]} ~ {index.names[other]}: {score:.2f}")
+    else:
+        exact = index.canonical()
+        near = index.canonical(args.threshold)
+        songs = len(index)
+        print(f"{songs} músicas")
+        print(
+            f"  duplicatas exatas (tom/andamento): {int((exact != range(songs)).sum())}"
+        )
+        print(
+            f"  quase duplicatas (>= {args.threshold}): "
+            f"{int((near != range(songs)).sum())}"
+        )
@@ -0,0 +1,245 @@
+# Acervo de músicas em disco, pré-interpretado: um arquivo binário com o
+# texto RTTTL e as notas empacotadas de cada música (lido via mmap) e um
+# índice JSON em colunas com nome, bpm e offsets. Buscar uma música só toca
+# os bytes dela, a listagem é paginada e a reconstrução reaproveita as
+# músicas cujo texto não mudou no rtttl_songs.txt.
+#
+# Uso: python song_store.py [rtttl_songs.txt]
+import hashlib
+import json
+import mmap
+import os
+import sys
+
+import numpy as np
+
+from rtttl import melody_from_columns, parse_melody
+
+STORE_VERSION = 1
+# altura MIDI e ticks; o bit mais alto dos ticks marca nota pontuada
+NOTE_DTYPE = np.dtype([("midi", "<i2"), ("ticks", "<u2")])
+_DOTTED_BIT = 0x8000
+_TICKS_MASK = 0x7FFF
+_INDEX_COLUMNS = ["names", "hashes", "bpm", "text", "text_size", "notes", "count"]
+
+
+def store_paths(source_path):
+    base, _ = os.path.splitext(source_path)
+    return base + ".bin", base + ".idx.json"
+
+
+def _line_hash(line):
+    return hashlib.blake2b(line.encode(), digest_size=8).hexdigest()
+
+
+def _read_source(source_path):
+    with open(source_path, "r") as file:
+        return [line.strip() for line in file if line.strip()]
+
+
+def _source_stamp(lines):
+    # pelo conteúdo já sem espaços e quebras de linha, e não pela data, para
+    # que o acervo versionado junto com o fonte continue válido depois de um
+    # clone ou de um checkout com CRLF
+    content = "\n".join(lines).encode()
+    return [len(lines), hashlib.blake2b(content, digest_size=16).hexdigest()]
+
+
+# Melodias que cobrem a gramática aceita (padrões ausentes ou fora da faixa,
+# pontos, as três grafias de sustenido, h, tercinas, tokens inválidos). A
+# impressão digital do que parse_melody faz com elas entra no índice: se a
+# interpretação mudar, as notas guardadas deixam de valer e tudo é
+# interpretado de novo, sem depender de lembrar de mudar STORE_VERSION.
+_PARSER_PROBES = [
+    "probe:d=8,o=5,b=125:c,#d,e#,f_,4g.,a.6,h,b9,c99,16p,32c#.,3d,p,xyz,1a,64b",
+    "probe::c,d.,2e",
+    "probe:o=20,d=4,b=60:c,8d",
+    "probe:o=-2,d=1,b=999:b,c",
+]
+
+
+def _parser_fingerprint():
+    digest = hashlib.blake2b(digest_size=8)
+    for probe in _PARSER_PROBES:
+        melody = parse_melody(probe)
+        digest.update(str(melody.bpm).encode())
+        for column in (melody.midi, melody.ticks, melody.dotted):
+            digest.update(np.ascontiguousarray(column, dtype="<i4").tobytes())
+    return digest.hexdigest()
+
+
+def _pack_notes(melody):
+    notes = np.empty(len(melody.midi), dtype=NOTE_DTYPE)
+    notes["midi"] = melody.midi
+    notes["ticks"] = melody.ticks.astype(np.uint16) | (melody.dotted * _DOTTED_BIT)
+    return notes.tobytes()
+
+
+def _load_index(index_path):
+    try:
+        with open(index_path, "r") as file:
+            index = json.load(file)
+    except (OSError, ValueError):
+        return None
+    return index if index.get("version") == STORE_VERSION else None
+
+
+def _build(source_path, force=False):
+    # (índice, estatísticas, dados); dados é None quando o acervo foi gravado
+    # em disco, ou os bytes do .bin se a pasta não aceita escrita
+    data_path, index_path = store_paths(source_path)
+    lines = _read_source(source_path)
+    stamp = _source_stamp(lines)
+    parser = _parser_fingerprint()
+    old_index = None if force else _load_index(index_path)
+    if not os.path.exists(data_path) or (old_index or {}).get("parser") != parser:
+        old_index = None
+    if old_index and old_index["source"] == stamp:
+        stats = {"songs": len(old_index["names"]), "reused": 0, "parsed": 0}
+        return old_index, stats, None
+
+    old_songs = {}
+    old_data = b""
+    if old_index:
+        old_songs = {
+            line_hash: song_id for song_id, line_hash in enumerate(old_index["hashes"])
+        }
+        with open(data_path, "rb") as file:
+            old_data = file.read()
+
+    index = {column: [] for column in _INDEX_COLUMNS}
+    reused = 0
+    data = bytearray()
+    for line in lines:
+        line_hash = _line_hash(line)
+        text = line.encode()
+        index["names"].append(line.split(":")[0])
+        index["hashes"].append(line_hash)
+        index["text"].append(len(data))
+        index["text_size"].append(len(text))
+        data += text
+
+        old = old_songs.get(line_hash)
+        if old is not None:
+            offset, count = old_index["notes"][old], old_index["count"][old]
+            size = max(count, 0) * NOTE_DTYPE.itemsize
+            packed, bpm = old_data[offset : offset + size], old_index["bpm"][old]
+            reused += 1
+        else:
+            try:
+                melody = parse_melody(line)
+            except ValueError:
+                packed, count, bpm = b"", -1, 0  # fica no catálogo, sem notas
+            else:
+                packed, count, bpm = _pack_notes(melody), len(melody.midi), melody.bpm
+        index["bpm"].append(bpm)
+        index["notes"].append(len(data))
+        index["count"].append(count)
+        data += packed
+
+    index.update(version=STORE_VERSION, parser=parser, source=stamp)
+    stats = {"songs": len(lines), "reused": reused, "parsed": len(lines) - reused}
+    try:
+        _write_store(data_path, index_path, data, index)
+    except OSError:
+        # deploy somente leitura: o acervo fica só na memória deste processo
+        return index, stats, bytes(data)
+    return index, stats, None
+
+
+def _write_store(data_path, index_path, data, index):
+    with open(data_path + ".tmp", "wb") as file:
+        file.write(data)
+    with open(index_path + ".tmp", "w") as file:
+        json.dump(index, file, separators=(",", ":"))
+    os.replace(data_path + ".tmp", data_path)
+    os.replace(index_path + ".tmp", index_path)
+
+
+def build_store(source_path, force=False):
+    # Reconstrói o acervo se o arquivo fonte mudou; devolve quantas músicas
+    # foram reaproveitadas e quantas foram interpretadas de novo
+    return _build(source_path, force)[1]
+
+
+class SongStore:
+    def __init__(self, source_path, index=None, data=None):
+        # data: conteúdo do .bin já em memória, em vez de mapear o arquivo
+        data_path, index_path = store_paths(source_path)
+        self.index = index or _load_index(index_path)
+        self.names = self.index["names"]
+        self._by_name = {}
+        for song_id, name in enumerate(self.names):
+            self._by_name.setdefault(name, []).append(song_id)
+        self._file = None
+        if data is not None:
+            self._data = data
+            return
+        self._file = open(data_path, "rb")
+        if os.fstat(self._file.fileno()).st_size:
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._data = b""
+
+    def __len__(self):
+        return len(self.names)
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        if self._file is not None:
+            self._file.close()
+
+    def find(self, name):
+        # ids de todas as músicas com este nome (o acervo tem repetidos)
+        return self._by_name.get(name, [])
+
+    def rtttl(self, song_id):
+        offset = self.index["text"][song_id]
+        return self._data[offset : offset + self.index["text_size"][song_id]].decode()
+
+    def melody(self, song_id):
+        count = self.index["count"][song_id]
+        if count < 0:
+            raise ValueError("Formato RTTTL inválido.")
+        notes = np.frombuffer(
+            self._data, NOTE_DTYPE, count=count, offset=self.index["notes"][song_id]
+        )
+        return melody_from_columns(
+            self.names[song_id],
+            self.index["bpm"][song_id],
+            notes["midi"].astype(np.int16),  # cópia, não prende o mmap
+            notes["ticks"] & _TICKS_MASK,
+            notes["ticks"] & _DOTTED_BIT,
+        )
+
+    def lookup(self, name):
+        ids = self.find(name)
+        if not ids:
+            raise KeyError(name)
+        return self.melody(ids[0])
+
+    def page_count(self, page_size=50):
+        return max(1, -(-len(self.names) // page_size))
+
+    def page(self, page, page_size=50):
+        # Linhas (nome, rtttl) de uma página do catálogo, começando em 0
+        start = page * page_size
+        return [
+            {"NOME": self.names[song_id], "RTTTL": self.rtttl(song_id)}
+            for song_id in range(start, min(start + page_size, len(self.names)))
+        ]
+
+
+def open_store(source_path):
+    index, _, data = _build(source_path)
+    return SongStore(source_path, index, data)
+
+
+if __name__ == "__main__":
+    source = sys.argv[1] if len(sys.argv) > 1 else "rtttl_songs.txt"
+    stats = build_store(source)
+    print(
+        f"{stats['songs']} músicas no acervo ({stats['reused']} reaproveitadas, "
+        f"{stats['parsed']} interpretadas)"
+    )